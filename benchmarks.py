@@ -0,0 +1,599 @@
+"""
+ Description: Benchmarks for the Quantified Self Project utilities. Each benchmark checks that the
+ fast path agrees with the original implementation before timing it, and returns its results as a
+ dictionary so runs can be printed or compared.
+
+ Usage: python benchmarks.py, or python benchmarks.py suite [sizes...] and python benchmarks.py compare
+ """
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import utils
+
+def _sample_descriptions(n_rows, bank_path="bank_data.csv", seed=0):
+    """
+    Builds a description column of n_rows by resampling the real bank export with random store numbers
+    """
+    rng = np.random.default_rng(seed)
+    descriptions = pd.read_csv(bank_path)["Description"].to_numpy(dtype=object)
+    picks = rng.choice(descriptions, size=n_rows)
+    store_numbers = rng.integers(0, 500, size=n_rows).astype(str)
+    return pd.Series(picks + " " + store_numbers.astype(object))
+
+def benchmark_categorization(n_rows=1_000_000, seed=0):
+    """
+    Compares categorize_transaction applied row by row against the vectorized categorize_transactions
+    """
+    descriptions = _sample_descriptions(n_rows, seed=seed)
+
+    start = time.perf_counter()
+    expected = descriptions.apply(utils.categorize_transaction)
+    row_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = utils.categorize_transactions(descriptions)
+    vectorized_seconds = time.perf_counter() - start
+
+    # Both paths must agree on every row
+    mismatches = int((result.to_numpy(dtype=object) != expected.to_numpy(dtype=object)).sum())
+    if mismatches:
+        raise AssertionError(f"categorize_transactions disagrees with categorize_transaction on {mismatches} rows")
+
+    return {
+        "rows": n_rows,
+        "row_seconds": row_seconds,
+        "vectorized_seconds": vectorized_seconds,
+        "row_rows_per_second": n_rows / row_seconds,
+        "vectorized_rows_per_second": n_rows / vectorized_seconds,
+        "speedup": row_seconds / vectorized_seconds
+    }
+
+def _tiled_merged_data(n_rows, merged_path="merged_data.csv"):
+    """
+    Builds a merged table of n_rows by repeating the real merged dataset
+    """
+    merged_df = pd.read_csv(merged_path, parse_dates=["Date"])
+    repeats = -(-n_rows // len(merged_df))
+    return pd.concat([merged_df] * repeats, ignore_index=True).head(n_rows)
+
+def _path_size(path):
+    """
+    Returns the size in bytes of a file, or of every file under a directory
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def benchmark_storage_formats(n_rows=1_000_000, partition_cols=None):
+    """
+    Compares file size, write time and load time of the merged dataset as csv, parquet and feather
+    """
+    merged_df = _tiled_merged_data(n_rows)
+    results = {"rows": n_rows}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for format, extension in utils.FILE_FORMATS.items():
+            path = os.path.join(tmp_dir, "merged_data" + extension)
+
+            start = time.perf_counter()
+            utils.write_table(merged_df, path, format=format,
+                              partition_cols=partition_cols if format == "parquet" else None)
+            results[f"{format}_write_seconds"] = time.perf_counter() - start
+            results[f"{format}_bytes"] = _path_size(path)
+
+            # Dates have to be parsed again from csv text, the columnar formats store them typed
+            start = time.perf_counter()
+            if format == "csv":
+                loaded = pd.read_csv(path, parse_dates=["Date"])
+            else:
+                loaded = utils.read_table(path, format=format)
+            results[f"{format}_load_seconds"] = time.perf_counter() - start
+
+            if len(loaded) != n_rows:
+                raise AssertionError(f"{format} round trip returned {len(loaded)} rows instead of {n_rows}")
+
+    return results
+
+def _derive_features_rowwise(bank_df):
+    """
+    Derives the bank features the original way, one Python call per row
+    """
+    features = pd.DataFrame(index=bank_df.index)
+    features["Transaction_Type"] = bank_df["Amount"].apply(lambda amount: "Debit" if amount < 0 else "Credit")
+    features["Day_of_Week"] = bank_df["Date"].dt.day_name()
+    features["Month"] = bank_df["Date"].dt.strftime("%B")
+    features["Category"] = bank_df["Description"].apply(utils.categorize_transaction)
+    features["Spending_Bin"] = bank_df["Amount"].abs().apply(utils.create_spending_bins)
+    return features
+
+def benchmark_feature_derivation(n_rows=1_000_000, seed=0):
+    """
+    Compares the row-wise feature derivation against the categorical features built by clean_bank_data
+    """
+    rng = np.random.default_rng(seed)
+    bank_df = pd.DataFrame({
+        "Date": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 5 * 365, size=n_rows), unit="D"),
+        "Description": _sample_descriptions(n_rows, seed=seed),
+        "Amount": np.round(rng.normal(-20, 60, size=n_rows), 2)
+    })
+    
+    start = time.perf_counter()
+    expected = _derive_features_rowwise(bank_df)
+    row_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    cleaned = utils.clean_bank_data(bank_df.copy())
+    vectorized_seconds = time.perf_counter() - start
+    
+    for column in expected.columns:
+        if not (cleaned[column].astype(object) == expected[column].astype(object)).all():
+            raise AssertionError(f"clean_bank_data disagrees with the row-wise {column}")
+    
+    # Academic period types, checked against get_period_type on the real calendar repeated to n_rows
+    calendar = pd.read_csv("academic_calendar.csv")
+    calendar = calendar.sample(n=n_rows, replace=True, random_state=seed).reset_index(drop=True)
+    
+    start = time.perf_counter()
+    expected_periods = calendar.apply(
+        lambda row: utils.get_period_type(row["academic_event_type"], row["class_activity"]), axis=1
+    )
+    period_row_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    periods = utils.get_period_types(calendar["academic_event_type"], calendar["class_activity"])
+    period_vectorized_seconds = time.perf_counter() - start
+    
+    if not (periods.astype(object) == expected_periods).all():
+        raise AssertionError("get_period_types disagrees with get_period_type")
+        
+    return {
+        "rows": n_rows,
+        "row_seconds": row_seconds,
+        "vectorized_seconds": vectorized_seconds,
+        "speedup": row_seconds / vectorized_seconds,
+        "row_feature_bytes": int(expected.memory_usage(deep=True).sum()),
+        "categorical_feature_bytes": int(cleaned[expected.columns].memory_usage(deep=True).sum()),
+        "period_row_seconds": period_row_seconds,
+        "period_vectorized_seconds": period_vectorized_seconds,
+        "period_speedup": period_row_seconds / period_vectorized_seconds
+    }
+
+def benchmark_hypothesis_tests(n_rows=1_000_000, n_partitions=8):
+    """
+    Checks the summary-based t-tests against scipy and times building, merging and testing the summaries
+    """
+    merged_df = _tiled_merged_data(n_rows)
+    rng = np.random.default_rng(0)
+    merged_df["Absolute_Amount"] = merged_df["Absolute_Amount"] * rng.lognormal(0, 0.3, size=n_rows)
+    
+    # Reference: scipy on materialized series, the way the tests used to run
+    start = time.perf_counter()
+    debit_data = merged_df[merged_df["Transaction_Type"] == "Debit"]
+    periods = debit_data["period_type"]
+    splits = {
+        "test_weekend_vs_weekday_spending": (~periods.isin(["Weekend", "Break"]), periods == "Weekend"),
+        "test_assessment_vs_class_spending": (periods == "Assessment Period", periods == "Class Period"),
+        "test_break_vs_regular_spending": (periods == "Break", periods.isin(["Class Period", "Assessment Period"]))
+    }
+    expected = {
+        name: stats.ttest_ind(debit_data.loc[first, "Absolute_Amount"], debit_data.loc[second, "Absolute_Amount"],
+                              equal_var=False)
+        for name, (first, second) in splits.items()
+    }
+    scipy_seconds = time.perf_counter() - start
+    
+    # Summaries built per partition and merged, as a chunked or incremental run would
+    partitions = [merged_df.iloc[rows] for rows in np.array_split(np.arange(n_rows), n_partitions)]
+    start = time.perf_counter()
+    summary = None
+    for partition in partitions:
+        partition_summary = utils.summarize_spending_groups(partition)
+        summary = partition_summary if summary is None else utils.combine_spending_summaries(summary, partition_summary)
+    summary_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    results = {name: getattr(utils, name)(None, summary=summary) for name in splits}
+    test_seconds = time.perf_counter() - start
+    
+    for name, (t_stat, p_value) in expected.items():
+        # The assessment test reports a one-tailed p-value for assessment < class
+        if name == "test_assessment_vs_class_spending":
+            p_value = p_value / 2 if t_stat < 0 else 1 - (p_value / 2)
+        if not np.isclose(results[name]["t_stat"], t_stat, rtol=1e-9):
+            raise AssertionError(f"{name} t statistic {results[name]['t_stat']} doesn't match scipy's {t_stat}")
+        if not np.isclose(results[name]["p_value"], p_value, rtol=1e-6):
+            raise AssertionError(f"{name} p-value {results[name]['p_value']} doesn't match scipy's {p_value}")
+        
+    return {
+        "rows": n_rows,
+        "partitions": n_partitions,
+        "scipy_seconds": scipy_seconds,
+        "summary_seconds": summary_seconds,
+        "summary_test_seconds": test_seconds
+    }
+
+def benchmark_resampling(resample_counts=(1_000, 10_000, 100_000), n_rows=2_000, method="bootstrap", max_workers=None):
+    """
+    Times the resampling test for each period comparison against the number of resamples, serially and on a process pool
+    """
+    merged_df = _tiled_merged_data(n_rows)
+    results = {"rows": n_rows, "method": method}
+    
+    for n_resamples in resample_counts:
+        for label, workers in [("serial", 1), ("pool", max_workers)]:
+            start = time.perf_counter()
+            comparisons = utils.resample_period_comparisons(merged_df, n_resamples=n_resamples, method=method,
+                                                            max_workers=workers)
+            results[f"{label}_seconds_{n_resamples}"] = time.perf_counter() - start
+            
+            # Seeding is per chunk, so the worker count must not change the answer
+            p_values = {name: result["p_value"] for name, result in comparisons.items()}
+            if label == "serial":
+                serial_p_values = p_values
+            elif p_values != serial_p_values:
+                raise AssertionError(f"Pool results differ from serial results at {n_resamples} resamples")
+                
+    return results
+
+def benchmark_report_rendering(n_rows=100_000, max_workers=None):
+    """
+    Times rendering the standard report set to files, with one worker and with a full process pool
+    """
+    merged_df = _tiled_merged_data(n_rows)
+    cube = utils.build_spending_cube(merged_df)
+    reports = utils.build_report_jobs(merged_df, merged_df, cube=cube)
+    results = {"rows": n_rows, "reports": len(reports)}
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, workers in [("single_worker", 1), ("pool", max_workers)]:
+            rendered = utils.render_reports(reports, os.path.join(tmp_dir, label), max_workers=workers)
+            if rendered["errors"]:
+                raise AssertionError(f"Reports failed to render: {rendered['errors']}")
+            results[f"{label}_seconds"] = rendered["seconds"]
+            
+    return results
+
+# Modules the data path (load, clean, merge) must not pull in when utils is imported
+HEAVY_MODULES = ["matplotlib", "seaborn", "scipy", "sklearn"]
+
+def benchmark_import_time(repeats=5, max_import_ms=None):
+    """
+    Measures cold-start import time of utils with python -X importtime and checks no heavy dependency is loaded
+    """
+    script = "import sys, utils; print(','.join(m for m in %r if m in sys.modules))" % HEAVY_MODULES
+    cumulative_us = []
+    
+    for _ in range(repeats):
+        # A fresh interpreter each time, so nothing is already imported
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                                   capture_output=True, text=True, check=True,
+                                   cwd=os.path.dirname(os.path.abspath(utils.__file__)))
+        loaded = completed.stdout.strip()
+        if loaded:
+            raise AssertionError(f"Importing utils loaded heavy dependencies: {loaded}")
+        
+        # Lines look like "import time:  self [us] | cumulative | imported package"
+        for line in completed.stderr.splitlines():
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) == 3 and fields[2] == "utils":
+                cumulative_us.append(int(fields[1]))
+                
+    import_ms = min(cumulative_us) / 1000
+    if max_import_ms is not None and import_ms > max_import_ms:
+        raise AssertionError(f"Importing utils took {import_ms:.1f} ms, over the {max_import_ms} ms budget")
+    
+    return {
+        "repeats": repeats,
+        "best_import_ms": import_ms,
+        "median_import_ms": float(np.median(cumulative_us)) / 1000
+    }
+
+def benchmark_knn_backends(n_rows=1_000_000, k=5):
+    """
+    Compares the sklearn and prototype kNN backends on accuracy, prediction latency and pickled model size
+    """
+    import pickle
+    
+    merged_df = _tiled_merged_data(n_rows)
+    X_train, X_test, y_train, y_test, _, _ = utils.prepare_classification_data(merged_df)
+    results = {"train_rows": len(X_train), "test_rows": len(X_test)}
+    
+    predictions = {}
+    for backend in ["sklearn", "prototype"]:
+        start = time.perf_counter()
+        model = utils.train_knn_classifier(X_train, y_train, k=k, backend=backend)
+        results[f"{backend}_fit_seconds"] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        predictions[backend] = model.predict(X_test)
+        results[f"{backend}_predict_seconds"] = time.perf_counter() - start
+        results[f"{backend}_accuracy"] = float(np.mean(predictions[backend] == np.asarray(y_test)))
+        results[f"{backend}_model_bytes"] = len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+        
+    # Ties between equidistant duplicates are split proportionally rather than by index order, so only report agreement
+    results["agreement"] = float(np.mean(predictions["sklearn"] == predictions["prototype"]))
+    return results
+
+def benchmark_compact_schema(n_rows=1_000_000):
+    """
+    Measures bytes per row of the merged frame before and after converting it to the compact schema
+    """
+    merged_df = _tiled_merged_data(n_rows)
+    
+    start = time.perf_counter()
+    compact_df = utils.compact_frame(merged_df)
+    seconds = time.perf_counter() - start
+    
+    # Integer cents must round-trip to the original amounts
+    if not np.allclose(compact_df["Amount_Cents"].to_numpy() / 100, merged_df["Amount"].to_numpy()):
+        raise AssertionError("Compact amounts differ from the original amounts")
+        
+    report = utils.memory_report(merged_df, compact_df)
+    return {
+        "rows": n_rows,
+        "convert_seconds": seconds,
+        "before_bytes_per_row": report.loc["Total", "before_bytes_per_row"],
+        "after_bytes_per_row": report.loc["Total", "after_bytes_per_row"]
+    }
+
+def benchmark_anomaly_detection(n_rows=1_000_000, batch_size=10_000, n_single=20_000, seed=0):
+    """
+    Feeds a simulated transaction stream through the anomaly detector in micro-batches and one at a time
+    """
+    rng = np.random.default_rng(seed)
+    amounts = -np.round(rng.lognormal(2.8, 1.0, size=n_rows), 2)
+    feed = pd.DataFrame({
+        "Date": pd.Timestamp("2020-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 5 * 365, size=n_rows)), unit="D"),
+        "Description": _sample_descriptions(n_rows, seed=seed),
+        "Amount": amounts,
+        "Current balance": 1_000_000 + np.cumsum(amounts)
+    })
+    results = {"rows": n_rows, "batch_size": batch_size}
+    
+    state = utils.new_anomaly_state()
+    start = time.perf_counter()
+    alerts = 0
+    for offset in range(0, n_rows, batch_size):
+        alerts += int(utils.detect_anomalies(state, feed.iloc[offset:offset + batch_size])["amount_alert"].sum())
+    seconds = time.perf_counter() - start
+    results["batch_rows_per_second"] = n_rows / seconds
+    results["amount_alerts"] = alerts
+    
+    # The state must stay the same size however long the stream runs
+    if any(stats["warmup_values"] for stats in state["categories"].values()):
+        raise AssertionError("Warmup buffers were not released")
+    results["state_categories"] = len(state["categories"])
+    
+    state = utils.new_anomaly_state()
+    transactions = feed.head(n_single).to_dict("records")
+    start = time.perf_counter()
+    for transaction in transactions:
+        utils.detect_anomaly(state, transaction)
+    results["single_rows_per_second"] = n_single / (time.perf_counter() - start)
+    
+    return results
+
+def benchmark_instrumentation_overhead(n_rows=200_000, seed=0):
+    """
+    Times the scalar categorizer undecorated, instrumented but switched off, and instrumented and switched on
+    """
+    descriptions = _sample_descriptions(n_rows, seed=seed).tolist()
+    variants = [("undecorated", utils.categorize_transaction.__wrapped__, False),
+                ("disabled", utils.categorize_transaction, False),
+                ("enabled", utils.categorize_transaction, True)]
+    results = {"rows": n_rows}
+    
+    for label, function, enabled in variants:
+        if enabled:
+            utils.enable_instrumentation()
+        start = time.perf_counter()
+        for description in descriptions:
+            function(description)
+        results[f"{label}_seconds"] = time.perf_counter() - start
+        utils.disable_instrumentation()
+        
+    if utils.METRICS["categorize_transaction"]["rows"] != n_rows:
+        raise AssertionError("Instrumented calls were not all counted")
+    utils.reset_metrics()
+    
+    results["disabled_overhead_ns_per_call"] = (results["disabled_seconds"] - results["undecorated_seconds"]) / n_rows * 1e9
+    return results
+
+def benchmark_online_classifier(n_rows=1_000_000, batch_size=5_000, retrain_every=20, seed=0):
+    """
+    Compares online updates against periodic full decision tree retraining, both scored test-then-train
+    """
+    import pickle
+    import synthetic_data
+    
+    bank_df = synthetic_data.generate_bank_export(n_rows, seed=seed)
+    academic_df = synthetic_data.generate_academic_calendar(seed=seed)
+    merged_df = utils.merge_datasets(utils.clean_bank_data(bank_df), utils.clean_academic_data(academic_df), save=False)
+    pipeline = utils.build_spending_model(utils.fixed_spending_encoders(), None)
+    batches = list(utils.spending_feature_batches(pipeline, merged_df, batch_size))
+    results = {"rows": sum(len(y_batch) for _, y_batch in batches), "batches": len(batches)}
+    
+    model = utils.OnlineSpendingClassifier()
+    start = time.perf_counter()
+    _, metrics, _ = utils.prequential_evaluation(model, batches)
+    seconds = time.perf_counter() - start
+    results["online_rows_per_second"] = results["rows"] / seconds
+    results["online_accuracy"] = float(metrics["accuracy"])
+    results["online_model_bytes"] = len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    
+    # The baseline retrains on everything seen so far every retrain_every batches and predicts with the last tree in between
+    correct = 0
+    scored = 0
+    retrain_seconds = []
+    tree = None
+    for i, (X_batch, y_batch) in enumerate(batches):
+        if tree is not None:
+            correct += int(np.sum(tree.predict(X_batch) == y_batch))
+            scored += len(y_batch)
+        if i % retrain_every == 0:
+            start = time.perf_counter()
+            tree = utils.train_decision_tree_classifier(np.vstack([X for X, _ in batches[:i + 1]]),
+                                                        np.concatenate([y for _, y in batches[:i + 1]]))
+            retrain_seconds.append(time.perf_counter() - start)
+    results["retrain_accuracy"] = correct / scored
+    results["retrain_mean_seconds"] = float(np.mean(retrain_seconds))
+    results["retrain_last_seconds"] = retrain_seconds[-1]
+    
+    # After the same rows, the online counts must vote the way a fully grown tree does
+    X = np.vstack([X for X, _ in batches])
+    tree = utils.train_decision_tree_classifier(X, np.concatenate([y for _, y in batches]))
+    if not np.array_equal(tree.predict(X), model.predict(X)):
+        raise AssertionError("Online predictions differ from a decision tree retrained on all rows")
+        
+    results["update_vs_last_retrain_speedup"] = retrain_seconds[-1] / (seconds / len(batches))
+    return results
+
+def _git_commit():
+    """
+    Short hash of the checked out commit, or None outside a git checkout
+    """
+    completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(utils.__file__)))
+    return completed.stdout.strip() or None
+
+def _run_suite_stages(bank_path, academic_path):
+    """
+    Runs the notebook pipeline end to end on one dataset, each instrumented function records itself
+    """
+    bank_df, academic_df = utils.load_data(bank_path, academic_path)
+    bank_df = utils.clean_bank_data(bank_df)
+    academic_df = utils.clean_academic_data(academic_df)
+    merged_df = utils.merge_datasets(bank_df, academic_df, save=False)
+    
+    cube = utils.build_spending_cube(merged_df)
+    utils.get_spending_statistics(merged_df, cube=cube)
+    utils.get_period_spending_statistics(merged_df, cube=cube)
+    utils.test_weekend_vs_weekday_spending(merged_df)
+    utils.test_assessment_vs_class_spending(merged_df)
+    utils.test_break_vs_regular_spending(merged_df)
+    
+    X_train, X_test, y_train, _, _, _ = utils.prepare_classification_data(merged_df)
+    models = [("knn", utils.train_knn_classifier(X_train, y_train)),
+              ("decision_tree", utils.train_decision_tree_classifier(X_train, y_train))]
+    for name, model in models:
+        with utils.measure(f"predict_{name}", rows=len(X_test)):
+            model.predict(X_test)
+
+def run_benchmark_suite(sizes=(10_000, 1_000_000), results_path="benchmark_results.jsonl", data_dir="synthetic",
+                        trace_memory=True, max_in_memory_rows=5_000_000, seed=0):
+    """
+    Times and memory-profiles every pipeline stage on synthetic datasets of each size and appends the results
+    to a JSON lines file, one record per size and stage, so runs can be compared with compare_benchmark_runs
+    
+    Sizes above max_in_memory_rows only run the chunked stream_merge_datasets path.
+    """
+    import synthetic_data
+    
+    run = {
+        "run_id": time.strftime("%Y%m%dT%H%M%S"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "trace_memory": trace_memory
+    }
+    records = []
+    
+    for n_rows in sizes:
+        # Generated files are reused across runs, the generator is deterministic (use a new data_dir per seed)
+        bank_path = os.path.join(data_dir, f"bank_data_{n_rows}.csv")
+        academic_path = os.path.join(data_dir, "academic_calendar_2021-08-01_4y.csv")
+        if not (os.path.exists(bank_path) and os.path.exists(academic_path)):
+            bank_path, academic_path = synthetic_data.generate_dataset(data_dir, n_rows, seed=seed)
+            
+        # tracemalloc slows allocation-heavy code down several times, so timings come from a pass without it
+        # and allocation peaks from a second pass with it
+        passes = {}
+        for traced in [False, True] if trace_memory else [False]:
+            utils.reset_metrics()
+            utils.enable_instrumentation(trace_memory=traced, track_rss=True)
+            try:
+                if n_rows <= max_in_memory_rows:
+                    _run_suite_stages(bank_path, academic_path)
+                else:
+                    with tempfile.TemporaryDirectory() as output_dir:
+                        utils.stream_merge_datasets(bank_path, academic_path,
+                                                    output_filename=os.path.join(output_dir, "merged_data.csv"))
+            finally:
+                utils.disable_instrumentation()
+            passes[traced] = utils.get_metrics()
+        utils.reset_metrics()
+        
+        metrics = passes[False]
+        if trace_memory:
+            metrics = metrics.join(passes[True][["peak_traced_bytes"]])
+        for stage, stage_metrics in metrics.iterrows():
+            records.append({**run, "dataset_rows": n_rows, "stage": stage,
+                            **{key: (None if pd.isna(value) else value) for key, value in stage_metrics.items()}})
+            
+    results = pd.DataFrame(records)
+    results.to_json(results_path, orient="records", lines=True, mode="a")
+    return results
+
+def compare_benchmark_runs(results_path="benchmark_results.jsonl", baseline=None, candidate=None, threshold=1.25,
+                           min_seconds=0.05):
+    """
+    Compares two suite runs stage by stage (the last two by default) and flags stages that got slower
+    or allocated more than threshold times the baseline; stages faster than min_seconds are too noisy to flag on time
+    """
+    results = pd.read_json(results_path, lines=True, dtype={"run_id": str})
+    if "peak_traced_bytes" not in results.columns:
+        results["peak_traced_bytes"] = np.nan
+    run_ids = list(dict.fromkeys(results["run_id"]))
+    if baseline is None or candidate is None:
+        if len(run_ids) < 2:
+            raise ValueError("Need at least two runs to compare")
+        baseline, candidate = run_ids[-2], run_ids[-1]
+        
+    columns = ["dataset_rows", "stage", "seconds", "peak_traced_bytes"]
+    comparison = pd.merge(results.loc[results["run_id"] == baseline, columns],
+                          results.loc[results["run_id"] == candidate, columns],
+                          on=["dataset_rows", "stage"], suffixes=("_baseline", "_candidate"))
+    comparison["time_ratio"] = comparison["seconds_candidate"] / comparison["seconds_baseline"]
+    comparison["memory_ratio"] = comparison["peak_traced_bytes_candidate"] / comparison["peak_traced_bytes_baseline"]
+    slower = (comparison["time_ratio"] > threshold) & (comparison["seconds_baseline"] >= min_seconds)
+    comparison["regression"] = slower | (comparison["memory_ratio"] > threshold)
+    
+    return comparison.sort_values(["dataset_rows", "time_ratio"], ascending=[True, False], ignore_index=True)
+
+if __name__ == "__main__":
+    # "python benchmarks.py suite [sizes...]" runs the stored suite, "compare" checks the last two suite runs
+    if sys.argv[1:2] == ["suite"]:
+        sizes = [int(size) for size in sys.argv[2:]] or [10_000, 1_000_000]
+        print(run_benchmark_suite(sizes).to_string())
+        sys.exit()
+    if sys.argv[1:2] == ["compare"]:
+        comparison = compare_benchmark_runs()
+        print(comparison.to_string())
+        sys.exit(1 if comparison["regression"].any() else 0)
+        
+    benchmarks = [
+        ("categorization", benchmark_categorization()),
+        ("storage formats", benchmark_storage_formats()),
+        ("feature derivation", benchmark_feature_derivation()),
+        ("hypothesis tests", benchmark_hypothesis_tests()),
+        ("resampling", benchmark_resampling()),
+        ("report rendering", benchmark_report_rendering()),
+        ("import time", benchmark_import_time()),
+        ("knn backends", benchmark_knn_backends()),
+        ("compact schema", benchmark_compact_schema()),
+        ("anomaly detection", benchmark_anomaly_detection()),
+        ("instrumentation overhead", benchmark_instrumentation_overhead()),
+        ("online classifier", benchmark_online_classifier())
+    ]
+    for name, result in benchmarks:
+        print(name)
+        for key, value in result.items():
+            print(f"  {key}: {value}")
@@ -0,0 +1,287 @@
+"""
+ Description: Asynchronous ingestion front end for the Quantified Self Project. Bank exports dropped
+ into a folder, or CSV records written to a local socket, are cut into micro-batches and handed
+ through bounded queues to a process pool that runs the cleaning and merging steps from utils. The
+ merged rows are then appended to the merged dataset. Full queues make the readers wait, so a fast
+ feed can't outrun the pool, and shutting down flushes every partial batch before exiting.
+
+ Usage: python ingest_service.py <academic_calendar.csv> <drop_dir> [merged_output.csv]
+ """
+
+import asyncio
+import io
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import utils
+
+# Cleaned academic calendar held by each pool worker, loaded once by _init_worker
+_CALENDAR = None
+
+def _init_worker(academic_path):
+    """
+    Pool initializer that cleans the academic calendar once per worker instead of once per batch
+    """
+    global _CALENDAR
+    _CALENDAR = utils.clean_academic_data(utils.read_table(academic_path))
+
+def _clean_and_merge(bank_df):
+    """
+    Runs the vectorized cleaning and calendar join on one micro-batch of raw bank records
+    """
+    return utils.merge_datasets(utils.clean_bank_data(bank_df), _CALENDAR, save=False)
+
+def _new_batch(bank_df, source, path=None):
+    """
+    Wraps a micro-batch with the timestamps used for the latency percentiles and the file it came from, if any
+    """
+    now = time.perf_counter()
+    return {"rows": bank_df, "source": source, "path": path, "created": now, "queued": now}
+
+async def _put_batch(queue, bank_df, source, stats, path=None):
+    """
+    Queues a non-empty micro-batch, waiting while the queue is full
+    """
+    if len(bank_df) == 0:
+        return
+
+    start = time.perf_counter()
+    await queue.put(_new_batch(bank_df, source, path))
+    stats["backpressure_seconds"] += time.perf_counter() - start
+
+def _settle_file(path, files, stats):
+    """
+    Moves a dropped file to processed/ once all its batches are written, or to failed/ if any of them failed
+    """
+    entry = files[path]
+    if not entry["read"] or entry["batches"]:
+        return
+
+    target_dir = entry["failed_dir"] if entry["failed"] else entry["processed_dir"]
+    os.replace(path, os.path.join(target_dir, os.path.basename(path)))
+    stats["failed_files" if entry["failed"] else "files"] += 1
+    del files[path]
+
+async def watch_drop_directory(drop_dir, queue, stop_event, stats, files, batch_size=5_000, poll_interval=1.0):
+    """
+    Polls a folder for new .csv bank exports and queues them in micro-batches
+
+    Each file is tracked in files until the writer has handled all its batches, then moved to
+    drop_dir/processed, or to drop_dir/failed if a batch failed. Writers should create files under
+    another name and rename them to .csv, so half-written exports are never picked up.
+    """
+    processed_dir = os.path.join(drop_dir, "processed")
+    failed_dir = os.path.join(drop_dir, "failed")
+    os.makedirs(processed_dir, exist_ok=True)
+    os.makedirs(failed_dir, exist_ok=True)
+
+    while not stop_event.is_set():
+        # Files still in flight stay in the folder until they are settled, so they are skipped here
+        paths = sorted(
+            (os.path.join(drop_dir, name) for name in os.listdir(drop_dir)
+             if name.endswith(".csv") and os.path.join(drop_dir, name) not in files),
+            key=os.path.getmtime
+        )
+        for path in paths:
+            files[path] = {"batches": 0, "read": False, "failed": False,
+                           "processed_dir": processed_dir, "failed_dir": failed_dir}
+            try:
+                # Chunks are read off the event loop, and each one waits for queue space before the next is read
+                chunks = await asyncio.to_thread(utils.read_table, path, "csv", None, batch_size)
+                while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                    if len(chunk):
+                        files[path]["batches"] += 1
+                    await _put_batch(queue, chunk, os.path.basename(path), stats, path)
+                chunks.close()
+            except Exception as error:
+                # An unreadable file is failed like a bad batch, after the batches already queued are done
+                files[path]["failed"] = True
+                stats["errors"].append(f"{os.path.basename(path)}: {type(error).__name__}: {error}")
+            files[path]["read"] = True
+            _settle_file(path, files, stats)
+
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+async def read_record_stream(reader, queue, stats, batch_size=5_000, flush_interval=1.0, source="stream"):
+    """
+    Reads CSV records from a stream (a header line, then one record per line) and queues them in micro-batches
+
+    A batch is queued once it is full or the stream has been idle for flush_interval seconds. Whatever is
+    buffered is flushed when the stream ends or the task is cancelled.
+    """
+    header = (await reader.readline()).decode()
+    lines = []
+
+    async def flush():
+        if lines:
+            await _put_batch(queue, pd.read_csv(io.StringIO(header + "".join(lines))), source, stats)
+            lines.clear()
+
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout=flush_interval)
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            if not line:
+                break
+            lines.append(line.decode())
+            if len(lines) >= batch_size:
+                await flush()
+    finally:
+        await flush()
+
+async def _process_stage(in_queue, out_queue, executor, stats):
+    """
+    Cleans and merges micro-batches on the process pool until it receives the end marker
+    """
+    loop = asyncio.get_running_loop()
+    while (batch := await in_queue.get()) is not None:
+        # A bad batch is recorded and passed on empty, so one malformed export can't stop the stage
+        try:
+            batch["merged"] = await loop.run_in_executor(executor, _clean_and_merge, batch.pop("rows"))
+        except Exception as error:
+            batch["merged"] = None
+            stats["failed_batches"] += 1
+            stats["errors"].append(f"{batch['source']}: {type(error).__name__}: {error}")
+
+        now = time.perf_counter()
+        if batch["merged"] is not None:
+            stats["latency"]["clean_merge"].append(now - batch["queued"])
+        batch["queued"] = now
+        await out_queue.put(batch)
+
+async def _write_stage(queue, output_path, format, stats, files):
+    """
+    Appends merged micro-batches to the output dataset in arrival order until it receives the end marker
+    """
+    while (batch := await queue.get()) is not None:
+        merged_df = batch.pop("merged")
+        failed = merged_df is None
+        if not failed:
+            try:
+                append = os.path.exists(output_path)
+                await asyncio.to_thread(utils.write_table, merged_df, output_path, format, None, append)
+            except Exception as error:
+                failed = True
+                stats["failed_batches"] += 1
+                stats["errors"].append(f"{batch['source']}: {type(error).__name__}: {error}")
+
+        if not failed:
+            now = time.perf_counter()
+            stats["latency"]["write"].append(now - batch["queued"])
+            stats["latency"]["end_to_end"].append(now - batch["created"])
+            stats["batches"] += 1
+            stats["rows"] += len(merged_df)
+
+        # The file a batch came from is only moved once all its batches got this far
+        if batch["path"] is not None:
+            files[batch["path"]]["batches"] -= 1
+            files[batch["path"]]["failed"] |= failed
+            _settle_file(batch["path"], files, stats)
+
+def _latency_summary(stats):
+    """
+    Turns the recorded per-batch latencies into p50, p95, p99 and max milliseconds for each stage
+    """
+    summary = {key: value for key, value in stats.items() if key != "latency"}
+    for stage, latencies in stats["latency"].items():
+        latencies = np.array(latencies) * 1000
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist()
+            summary[stage] = {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": float(latencies.max())}
+        else:
+            summary[stage] = {"p50_ms": np.nan, "p95_ms": np.nan, "p99_ms": np.nan, "max_ms": np.nan}
+    return summary
+
+async def run_ingest_service(academic_path, output_path="merged_data.csv", drop_dir=None, socket_path=None,
+                             format="csv", batch_size=5_000, queue_size=4, max_workers=None,
+                             poll_interval=1.0, flush_interval=1.0, stop_event=None):
+    """
+    Runs the ingestion pipeline until stop_event is set (or SIGINT/SIGTERM when no event is given)
+
+    Sources (a drop folder and/or a unix socket) feed a bounded queue of raw micro-batches, one task per
+    pool worker cleans and merges them, and a single writer appends them to output_path. Batches from
+    different workers can finish out of order, so rows are appended in completion order. Batches that
+    fail are counted and skipped. Returns the row, batch and failure counts, the errors and latency
+    percentiles for each stage.
+    """
+    if drop_dir is None and socket_path is None:
+        raise ValueError("Give a drop_dir, a socket_path or both")
+
+    loop = asyncio.get_running_loop()
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop_event.set)
+
+    stats = {"files": 0, "failed_files": 0, "batches": 0, "failed_batches": 0, "rows": 0,
+             "backpressure_seconds": 0.0, "errors": [],
+             "latency": {"clean_merge": [], "write": [], "end_to_end": []}}
+    files = {}
+    raw_queue = asyncio.Queue(maxsize=queue_size)
+    merged_queue = asyncio.Queue(maxsize=queue_size)
+    n_workers = max_workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(academic_path,)) as executor:
+        processors = [asyncio.create_task(_process_stage(raw_queue, merged_queue, executor, stats))
+                      for _ in range(n_workers)]
+        writer = asyncio.create_task(_write_stage(merged_queue, output_path, format, stats, files))
+
+        sources = []
+        if drop_dir is not None:
+            sources.append(asyncio.create_task(
+                watch_drop_directory(drop_dir, raw_queue, stop_event, stats, files, batch_size, poll_interval)
+            ))
+
+        server = None
+        connections = set()
+        if socket_path is not None:
+            async def handle_connection(reader, writer_stream):
+                connections.add(asyncio.current_task())
+                try:
+                    await read_record_stream(reader, raw_queue, stats, batch_size, flush_interval, source="socket")
+                except asyncio.CancelledError:
+                    # Cancelled by shutdown after flushing its buffer, which is a normal end for a connection
+                    pass
+                finally:
+                    connections.discard(asyncio.current_task())
+                    writer_stream.close()
+            server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+
+        await stop_event.wait()
+
+        # Stop accepting input, let open connections flush what they have buffered, then drain each stage
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+            for connection in list(connections):
+                connection.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+            os.remove(socket_path)
+        await asyncio.gather(*sources)
+
+        for _ in processors:
+            await raw_queue.put(None)
+        await asyncio.gather(*processors)
+        await merged_queue.put(None)
+        await writer
+
+    return _latency_summary(stats)
+
+if __name__ == "__main__":
+    academic_path, drop_dir = sys.argv[1], sys.argv[2]
+    output_path = sys.argv[3] if len(sys.argv) > 3 else "merged_data.csv"
+
+    summary = asyncio.run(run_ingest_service(academic_path, output_path=output_path, drop_dir=drop_dir))
+    for key, value in summary.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,153 @@
+"""
+ Description: Out-of-core query layer for the Quantified Self Project. Runs grouped spending aggregations
+ over a parquet dataset of merged transactions without loading it into memory. Filters on Date,
+ Category, Transaction_Type and period_type are pushed down to partitions and row-group statistics,
+ only the columns a query needs are read, and each row group is aggregated on its own in a thread pool.
+ The partial results are then combined.
+
+ Usage: python spending_query.py <merged dataset dir or merged csv> <group_by> [<group_by> ...]
+ """
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+import utils
+
+# Columns that filters can be pushed down on
+FILTER_COLUMNS = ["Date", "Category", "Transaction_Type", "period_type"]
+
+# Group keys derived from Date rather than stored as columns
+DATE_KEYS = {"year": "%Y", "month": "%Y-%m"}
+
+def build_query_dataset(merged_path, dataset_path, partition_cols=("Transaction_Type",), chunksize=1_000_000):
+    """
+    Converts a merged csv into a parquet dataset for querying, chunk by chunk so it never has to fit in memory
+
+    Partitioning on a low-cardinality filter column lets those filters skip whole directories. Rows are
+    written in file order, so a date-sorted export also gets tight Date ranges per row group.
+    """
+    rows_written = 0
+    for i, chunk in enumerate(utils.read_table(merged_path, format="csv", chunksize=chunksize)):
+        chunk["Date"] = pd.to_datetime(chunk["Date"])
+        utils.write_table(chunk, dataset_path, format="parquet", partition_cols=list(partition_cols) or None,
+                          append=(i > 0))
+        rows_written += len(chunk)
+
+    return rows_written
+
+def _filter_expression(dataset, filters):
+    """
+    Turns {"Date": (start, end), column: value or list of values} into a pyarrow dataset expression
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    expression = None
+    for column, condition in (filters or {}).items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Can't filter on {column!r}, expected one of {FILTER_COLUMNS}")
+
+        field = ds.field(column)
+        if column == "Date":
+            # A half-open [start, end) range, either side may be None
+            start, end = condition
+            date_type = dataset.schema.field("Date").type
+            parts = []
+            if start is not None:
+                parts.append(field >= pa.scalar(pd.Timestamp(start)).cast(date_type))
+            if end is not None:
+                parts.append(field < pa.scalar(pd.Timestamp(end)).cast(date_type))
+            if not parts:
+                continue
+            condition_expression = parts[0] if len(parts) == 1 else parts[0] & parts[1]
+        else:
+            values = [condition] if isinstance(condition, str) else list(condition)
+            condition_expression = field.isin(values)
+
+        expression = condition_expression if expression is None else expression & condition_expression
+
+    return expression
+
+def _partial_aggregate(fragment, schema, columns, expression, by, amount_column):
+    """
+    Aggregates one row group to count, sum, sum of squares, min and max of the amount per group
+    """
+    # The dataset schema includes the partition columns, which the file itself doesn't store
+    table = fragment.to_table(schema=schema, columns=columns, filter=expression)
+    if table.num_rows == 0:
+        return None
+
+    frame = table.to_pandas()
+    for key, date_format in DATE_KEYS.items():
+        if key in by:
+            frame[key] = pd.to_datetime(frame["Date"]).dt.strftime(date_format)
+
+    amounts = frame[amount_column].astype(float)
+    grouped = frame.assign(_amount=amounts, _amount_sq=amounts ** 2).groupby(list(by), observed=True, dropna=False)
+    return grouped.agg(
+        count=("_amount", "size"),
+        sum=("_amount", "sum"),
+        sum_sq=("_amount_sq", "sum"),
+        min=("_amount", "min"),
+        max=("_amount", "max")
+    )
+
+def query_spending(dataset_path, by=("period_type",), filters=None, amount_column="Absolute_Amount", max_workers=None):
+    """
+    Returns count, sum, mean, std, min and max of the amount for each group of a parquet dataset of merged rows
+
+    by may name any stored column plus "year" and "month" (derived from Date). filters maps Date to a
+    [start, end) pair and Category, Transaction_Type or period_type to a value or a list of values. For
+    example, debit spending by Category, period_type and month:
+
+        query_spending(path, by=["Category", "period_type", "month"], filters={"Transaction_Type": "Debit"})
+    """
+    import pyarrow.dataset as ds
+
+    by = [by] if isinstance(by, str) else list(by)
+    dataset = ds.dataset(dataset_path, format="parquet", partitioning="hive")
+    expression = _filter_expression(dataset, filters)
+
+    # Column pruning: only the group keys and the amount are read; filter columns are evaluated by the scanner
+    columns = [key for key in by if key not in DATE_KEYS] + [amount_column]
+    if any(key in DATE_KEYS for key in by):
+        columns.append("Date")
+    columns = list(dict.fromkeys(columns))
+
+    # Partition filters drop whole files, row-group statistics drop the row groups that can't match
+    row_groups = [row_group for fragment in dataset.get_fragments(filter=expression)
+                  for row_group in fragment.split_by_row_group(expression, schema=dataset.schema)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        partials = [partial for partial in executor.map(
+            lambda row_group: _partial_aggregate(row_group, dataset.schema, columns, expression, by, amount_column),
+            row_groups
+        ) if partial is not None]
+
+    if not partials:
+        return pd.DataFrame(columns=["count", "sum", "mean", "std", "min", "max"])
+
+    # Combine the partial aggregates, then finish mean and std the way _cube_rollup does
+    result = pd.concat(partials).groupby(level=list(range(len(by))), dropna=False).agg(
+        {"count": "sum", "sum": "sum", "sum_sq": "sum", "min": "min", "max": "max"}
+    )
+    result.index.names = by
+    result["mean"] = result["sum"] / result["count"]
+    degrees_of_freedom = (result["count"] - 1).where(result["count"] > 1)
+    result["std"] = np.sqrt(((result["sum_sq"] - result["sum"] ** 2 / result["count"]) / degrees_of_freedom).clip(lower=0))
+    result.attrs["row_groups"] = len(row_groups)
+
+    return result[["count", "sum", "mean", "std", "min", "max"]].sort_index()
+
+if __name__ == "__main__":
+    dataset_path, by = sys.argv[1], sys.argv[2:] or ["period_type"]
+
+    # A merged csv is converted to a dataset next to it first
+    if not os.path.isdir(dataset_path):
+        merged_path, dataset_path = dataset_path, os.path.splitext(dataset_path)[0] + "_dataset"
+        build_query_dataset(merged_path, dataset_path)
+
+    print(query_spending(dataset_path, by=by, filters={"Transaction_Type": "Debit"}).to_string())
@@ -0,0 +1,212 @@
+"""
+ Description: Synthetic data generator for the Quantified Self Project. Builds bank exports and matching
+ academic calendars in the same layout as bank_data.csv and academic_calendar.csv, at any size and over
+ several years, so the utilities can be tested and benchmarked far beyond the real ~200 rows.
+ Merchants come from the keyword lists in utils.CATEGORY_KEYWORDS, so every generated transaction
+ categorizes the way a real one from that merchant would. Rows are written in date order.
+
+ Usage: python synthetic_data.py <n_rows> [output_dir]
+ """
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+import utils
+
+# Share of debits and log-normal amount parameters (mean and sigma of the log of the dollar amount) per category
+DEBIT_PROFILES = {
+    "Dining": (0.42, 2.6, 0.6),
+    "Groceries": (0.17, 3.0, 0.9),
+    "Transportation": (0.08, 3.2, 0.6),
+    "Retail": (0.12, 3.3, 0.8),
+    "Utilities": (0.02, 3.6, 0.4),
+    "Banking & Investments": (0.07, 3.0, 0.8),
+    "Subscriptions": (0.03, 3.0, 0.3),
+    "Parking": (0.04, 1.6, 0.4),
+    "Other": (0.05, 2.5, 0.7)
+}
+
+# Merchants that match none of the category keywords
+OTHER_MERCHANTS = ["SQ *PANHANDLE CONE & C", "BARNES NOBLE #", "GONZAGA BOOKSTORE", "SPOKANE ZOO", "REI #"]
+
+# Bank export Type of each debit category, card purchases unless listed
+DEBIT_TYPES = {"Utilities": "Direct Payment", "Banking & Investments": "Direct Payment",
+               "Subscriptions": "Direct Payment", "Rent": "Direct Payment"}
+
+# Credit descriptions, their Type and their share of credits
+CREDIT_KINDS = [
+    ("Mobile Check Deposit", "Check Deposit", 0.35),
+    ("Zelle® Payment from Alex Morgan", "Deposit", 0.45),
+    ("Interest earned", "Interest Earned", 0.20)
+]
+
+# Share of all rows that are credits, and the monthly rent paid on the 1st
+CREDIT_SHARE = 0.05
+RENT_AMOUNT = 1_700.0
+
+BANK_COLUMNS = ["Date", "Description", "Type", "Amount", "Current balance", "Status"]
+
+def _merchant_names():
+    """
+    Lists uppercase merchant names for each debit category, each containing one of the category's keywords
+    """
+    merchants = {category: [keyword.upper() for keyword in keywords] for category, keywords in utils.CATEGORY_KEYWORDS}
+    merchants["Other"] = OTHER_MERCHANTS
+
+    # Rent is generated separately on the 1st of each month, and credits have their own descriptions
+    merchants.pop("Rent")
+    merchants["Banking & Investments"] = ["VENMO", "ROBINHOOD", "Zelle® Payment to Alex Morgan"]
+    return merchants
+
+def _generate_chunk(n_rows, start, end, rng, opening_balance):
+    """
+    Generates n_rows transactions dated in [start, end), in date order, with balances continuing from opening_balance
+    """
+    # One rent payment on each 1st of the month in range, unless the chunk is too small to hold them
+    rent_dates = pd.date_range(start, end - pd.Timedelta(days=1), freq="MS")
+    rent_dates = rent_dates[:n_rows // 10]
+    n_credits = int(round((n_rows - len(rent_dates)) * CREDIT_SHARE))
+    n_debits = n_rows - len(rent_dates) - n_credits
+    n_days = max((end - start).days, 1)
+
+    # Card and direct debits
+    categories = list(DEBIT_PROFILES)
+    shares, log_means, log_sigmas = (np.array(values) for values in zip(*DEBIT_PROFILES.values()))
+    category_codes = rng.choice(len(categories), size=n_debits, p=shares / shares.sum())
+    debit_amounts = np.round(rng.lognormal(log_means[category_codes], log_sigmas[category_codes]), 2) + 0.5
+
+    merchants = _merchant_names()
+    descriptions = np.empty(n_debits, dtype=object)
+    types = np.empty(n_debits, dtype=object)
+    for code, category in enumerate(categories):
+        rows = category_codes == code
+        names = np.array(merchants[category], dtype=object)[rng.integers(0, len(merchants[category]), size=rows.sum())]
+
+        # Card purchases carry a store number like the real export
+        if category in DEBIT_TYPES:
+            descriptions[rows] = names
+        else:
+            descriptions[rows] = names + " #" + rng.integers(1, 9_999, size=rows.sum()).astype(str).astype(object)
+        types[rows] = DEBIT_TYPES.get(category, "Debit Card")
+
+    # Credits are scaled so income roughly covers spending, which keeps the balance bounded over many years
+    kinds, credit_types, credit_shares = zip(*CREDIT_KINDS)
+    kind_codes = rng.choice(len(kinds), size=n_credits, p=np.array(credit_shares) / sum(credit_shares))
+    credit_weights = np.where(np.array(kinds)[kind_codes] == "Interest earned", 0.001, rng.uniform(0.5, 1.5, size=n_credits))
+    spending = debit_amounts.sum() + RENT_AMOUNT * len(rent_dates)
+    credit_amounts = np.round(credit_weights / max(credit_weights.sum(), 1e-9) * spending * rng.uniform(1.0, 1.03), 2)
+
+    chunk = pd.DataFrame({
+        "Date": np.concatenate([
+            start + pd.to_timedelta(rng.integers(0, n_days, size=n_debits), unit="D"),
+
+            # Income arrives on a steady schedule rather than at random, like paychecks
+            start + pd.to_timedelta(np.linspace(0, n_days - 1, n_credits).astype(np.int64), unit="D"),
+            rent_dates + pd.to_timedelta(rng.integers(0, 3, size=len(rent_dates)), unit="D")
+        ]),
+        "Description": np.concatenate([descriptions, np.array(kinds, dtype=object)[kind_codes],
+                                       np.full(len(rent_dates), "Cooper George", dtype=object)]),
+        "Type": np.concatenate([types, np.array(credit_types, dtype=object)[kind_codes],
+                                np.full(len(rent_dates), DEBIT_TYPES["Rent"], dtype=object)]),
+        "Amount": np.concatenate([-debit_amounts, credit_amounts,
+                                  -np.round(RENT_AMOUNT + rng.normal(0, 10, size=len(rent_dates)), 2)]),
+        "Status": "Posted"
+    })
+    chunk = chunk.sort_values("Date", kind="stable", ignore_index=True)
+    chunk["Current balance"] = np.round(opening_balance + chunk["Amount"].cumsum(), 2)
+
+    return chunk[BANK_COLUMNS]
+
+def _chunk_bounds(n_rows, start, years, chunk_rows):
+    """
+    Splits the rows and the date span into consecutive chunks of at most chunk_rows rows each
+    """
+    start = pd.Timestamp(start)
+    end = start + pd.DateOffset(years=years)
+    n_chunks = max(1, -(-n_rows // chunk_rows))
+
+    # Whole-day boundaries, with the rows spread evenly over the chunks
+    edges = pd.to_datetime(np.linspace(start.value, end.value, n_chunks + 1)).normalize()
+    row_edges = np.linspace(0, n_rows, n_chunks + 1).astype(np.int64)
+    return [(row_edges[i + 1] - row_edges[i], edges[i], edges[i + 1]) for i in range(n_chunks)]
+
+def generate_bank_export(n_rows, start="2021-08-01", years=4, seed=0, opening_balance=1_000.0):
+    """
+    Generates a bank export of n_rows transactions over the given number of years, in date order
+    """
+    rng = np.random.default_rng(seed)
+    return _generate_chunk(n_rows, pd.Timestamp(start), pd.Timestamp(start) + pd.DateOffset(years=years),
+                           rng, opening_balance)
+
+def write_bank_export(path, n_rows, start="2021-08-01", years=4, seed=0, opening_balance=1_000.0,
+                      chunk_rows=1_000_000):
+    """
+    Writes a bank export chunk by chunk, so exports far larger than memory (50M rows) can be generated
+    """
+    # Every chunk gets its own child seed, so the output only depends on the arguments
+    bounds = _chunk_bounds(n_rows, start, years, chunk_rows)
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds))
+
+    balance = opening_balance
+    for i, ((chunk_size, chunk_start, chunk_end), chunk_seed) in enumerate(zip(bounds, seeds)):
+        chunk = _generate_chunk(int(chunk_size), chunk_start, chunk_end, np.random.default_rng(chunk_seed), balance)
+        chunk.to_csv(path, mode="a" if i else "w", header=not i, index=False, date_format="%Y-%m-%d")
+        if len(chunk):
+            balance = chunk["Current balance"].iloc[-1]
+
+    return path
+
+def generate_academic_calendar(start="2021-08-01", years=4, seed=0):
+    """
+    Generates a daily academic calendar with semesters, finals, holidays, breaks and weekends, in date order
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, pd.Timestamp(start) + pd.DateOffset(years=years) - pd.Timedelta(days=1), freq="D")
+    month, day, weekday = dates.month.to_numpy(), dates.day.to_numpy(), dates.dayofweek.to_numpy()
+    is_weekend = weekday >= 5
+
+    # Regular weekdays are mostly lectures with some quizzes and exams
+    events = np.full(len(dates), "Regular Classes", dtype=object)
+    activities = rng.choice(np.array(["Lecture", "Quiz", "Exam"], dtype=object), size=len(dates), p=[0.72, 0.2, 0.08])
+    events[is_weekend] = "Weekend"
+    activities[is_weekend] = "No Class"
+
+    # Later rules win, so whole-break periods come last and also cover their weekends
+    rules = [
+        ((month == 1) & (weekday == 0) & (day >= 15) & (day <= 21), "MLK Holiday", "Break"),
+        ((month == 2) & (weekday == 0) & (day >= 15) & (day <= 21), "President Holiday", "Break"),
+        ((month == 3) & (day >= 10) & (day <= 16) & ~is_weekend, "Spring Vacation", "Break"),
+        ((month == 3) & (day >= 10) & (day <= 16) & is_weekend, "Weekend", "Break"),
+        ((month == 11) & (day >= 26) & (day <= 29) & ~is_weekend, "Thanksgiving Holiday", "Break"),
+        (((month == 12) & (day == 6)) | ((month == 5) & (day == 3)), "Study Day", "Exam"),
+        (((month == 12) & (day >= 8) & (day <= 13)) | ((month == 5) & (day >= 4) & (day <= 9)), "Finals Week", "Exam"),
+        (((month == 12) & (day >= 14)) | ((month == 1) & (day < 13)), "Christmas Holiday", "Break"),
+        (((month == 5) & (day >= 10)) | (month == 6) | (month == 7) | ((month == 8) & (day < 26)), "Summer Break", "Break")
+    ]
+    for rows, event, activity in rules:
+        events[rows] = event
+        activities[rows] = activity
+
+    return pd.DataFrame({"date": dates.strftime("%Y-%m-%d"), "academic_event_type": events, "class_activity": activities})
+
+def generate_dataset(output_dir, n_rows, start="2021-08-01", years=4, seed=0, chunk_rows=1_000_000):
+    """
+    Writes a synthetic bank export and its matching academic calendar to output_dir and returns their paths
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    bank_path = os.path.join(output_dir, f"bank_data_{n_rows}.csv")
+    academic_path = os.path.join(output_dir, f"academic_calendar_{start}_{years}y.csv")
+
+    write_bank_export(bank_path, n_rows, start=start, years=years, seed=seed, chunk_rows=chunk_rows)
+    generate_academic_calendar(start=start, years=years, seed=seed).to_csv(academic_path, index=False)
+
+    return bank_path, academic_path
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1])
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else "synthetic"
+
+    for path in generate_dataset(output_dir, n_rows):
+        print(path)
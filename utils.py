@@ -10,28 +10,305 @@
  between academic periods and financial behavior.
  """
 
+import contextlib
+import functools
+import hashlib
+import inspect
+import itertools
+import json
+import math
+import os
+import pickle
+import re
+import shutil
+import sys
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy import stats
-from sklearn.preprocessing import LabelEncoder, MinMaxScaler
-from sklearn.model_selection import train_test_split
-from sklearn.tree import DecisionTreeClassifier, plot_tree
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.metrics import accuracy_score
 
-def load_data(bank_path, academic_path):
+# matplotlib, seaborn, scipy and scikit-learn are imported inside the functions that use them, so the
+# data path (loading, cleaning, merging) starts up without paying for them
+
+# Instrumentation is off by default, and while it is off an instrumented function only pays for one dict lookup
+INSTRUMENTATION = {"enabled": False, "trace_memory": False, "track_rss": False, "started_tracing": False}
+
+# Totals per instrumented function or measured block, collected while instrumentation is on
+METRICS = {}
+
+# Open measure() blocks, innermost last, so nested blocks can share tracemalloc's single peak counter
+_MEASURE_STACK = []
+
+def enable_instrumentation(trace_memory=False, track_rss=False):
+    """ 
+    Turns on timing and row counting for the instrumented functions, optionally with tracemalloc and peak RSS
+    """
+    INSTRUMENTATION.update(enabled=True, trace_memory=trace_memory, track_rss=track_rss)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        INSTRUMENTATION["started_tracing"] = True
+
+def disable_instrumentation():
+    """ 
+    Turns instrumentation off, keeping the metrics collected so far
+    """
+    if INSTRUMENTATION["started_tracing"]:
+        tracemalloc.stop()
+    INSTRUMENTATION.update(enabled=False, trace_memory=False, track_rss=False, started_tracing=False)
+
+def reset_metrics():
+    """ 
+    Clears the collected metrics
+    """
+    METRICS.clear()
+
+def _peak_rss_bytes():
+    """ 
+    Peak resident set size of this process so far, or None where the resource module is missing (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+@contextlib.contextmanager
+def measure(name, rows=None):
+    """ 
+    Times a block and adds it to METRICS under name; set rows on the yielded dict to count rows afterwards
+    """
+    frame = {"rows": rows, "peak": 0}
+    if not INSTRUMENTATION["enabled"]:
+        yield frame
+        return
+    
+    trace = INSTRUMENTATION["trace_memory"] and tracemalloc.is_tracing()
+    if trace:
+        # Hand the peak so far to the enclosing block before restarting the count for this one
+        current, peak = tracemalloc.get_traced_memory()
+        if _MEASURE_STACK:
+            _MEASURE_STACK[-1]["peak"] = max(_MEASURE_STACK[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame["start_bytes"] = current
+        
+    _MEASURE_STACK.append(frame)
+    start = time.perf_counter()
+    try:
+        yield frame
+    finally:
+        seconds = time.perf_counter() - start
+        _MEASURE_STACK.pop()
+        
+        metrics = METRICS.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0})
+        metrics["calls"] += 1
+        metrics["seconds"] += seconds
+        metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+        if frame["rows"] is not None:
+            metrics["rows"] += frame["rows"]
+            
+        if trace:
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            metrics["peak_traced_bytes"] = max(metrics.get("peak_traced_bytes", 0), peak - frame["start_bytes"])
+            if _MEASURE_STACK:
+                _MEASURE_STACK[-1]["peak"] = max(_MEASURE_STACK[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            
+        if INSTRUMENTATION["track_rss"]:
+            metrics["peak_rss_bytes"] = _peak_rss_bytes()
+
+def _count_rows(args, result):
+    """ 
+    Rows a call handled: the length of its first table argument or of the table it returned, the row count
+    a streaming writer returned, or 1 for a function of a single record
+    """
+    tables = (pd.DataFrame, pd.Series, np.ndarray)
+    for value in args:
+        if isinstance(value, tables):
+            return len(value)
+        
+    # Loaders take paths and return the tables they read
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, tables):
+        return len(result)
+    
+    # Streaming writers return the number of rows they wrote
+    if isinstance(result, (int, np.integer)) and not isinstance(result, bool):
+        return int(result)
+    
+    if len(args) == 1 and isinstance(args[0], (str, int, float)):
+        return 1
+    return None
+
+def instrumented(function):
+    """ 
+    Decorator that records calls, time and rows of a function in METRICS while instrumentation is on
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not INSTRUMENTATION["enabled"]:
+            return function(*args, **kwargs)
+        
+        with measure(function.__name__) as frame:
+            result = function(*args, **kwargs)
+            frame["rows"] = _count_rows(args, result)
+        return result
+    
+    return wrapper
+
+def get_metrics():
     """ 
-    Loads banking and academic data from the CSV files
+    Returns the collected metrics as a DataFrame with one row per function, including rows per second
     """
-    bank_data = pd.read_csv(bank_path)
-    academic_data = pd.read_csv(academic_path)
+    metrics = pd.DataFrame.from_dict(METRICS, orient="index")
+    if len(metrics):
+        metrics["rows_per_second"] = metrics["rows"] / metrics["seconds"].where(metrics["seconds"] > 0)
+    return metrics
+
+def export_metrics(path, format="json"):
+    """ 
+    Writes the collected metrics as JSON or as a Prometheus text exposition file
+    """
+    metrics = get_metrics()
+    
+    if format == "json":
+        with open(path, "w") as metrics_file:
+            json.dump({"peak_rss_bytes": _peak_rss_bytes(),
+                       "functions": json.loads(metrics.to_json(orient="index"))}, metrics_file, indent=2)
+        return
+    if format != "prometheus":
+        raise ValueError(f"Unknown metrics format {format!r}, expected 'json' or 'prometheus'")
+    
+    # Metric name, column, type and help text for each exported series
+    series = [
+        ("calls_total", "calls", "counter", "Calls of each instrumented function"),
+        ("seconds_total", "seconds", "counter", "Total seconds spent in each instrumented function"),
+        ("max_seconds", "max_seconds", "gauge", "Slowest single call of each instrumented function"),
+        ("rows_total", "rows", "counter", "Rows processed by each instrumented function"),
+        ("rows_per_second", "rows_per_second", "gauge", "Average rows per second of each instrumented function"),
+        ("peak_traced_bytes", "peak_traced_bytes", "gauge", "Largest tracemalloc peak of a single call")
+    ]
+    lines = []
+    for metric, column, metric_type, help_text in series:
+        if column not in metrics.columns:
+            continue
+        lines += [f"# HELP quantified_self_{metric} {help_text}", f"# TYPE quantified_self_{metric} {metric_type}"]
+        for function_name, value in metrics[column].dropna().items():
+            lines.append(f'quantified_self_{metric}{{function="{function_name}"}} {value}')
+            
+    peak_rss = _peak_rss_bytes()
+    if peak_rss is not None:
+        lines += ["# HELP quantified_self_peak_rss_bytes Peak resident set size of the process",
+                  "# TYPE quantified_self_peak_rss_bytes gauge", f"quantified_self_peak_rss_bytes {peak_rss}"]
+        
+    with open(path, "w") as metrics_file:
+        metrics_file.write("\n".join(lines) + "\n")
+
+# File extensions for each supported storage format
+FILE_FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+# Low-cardinality string columns that are stored dictionary-encoded in the columnar formats
+DICTIONARY_COLUMNS = ["Type", "Status", "Transaction_Type", "Day_of_Week", "Month", "Category",
+                      "Spending_Bin", "academic_event_type", "class_activity", "day_of_week", "period_type"]
+
+# Rows per parquet row group, large groups keep the per-group metadata small
+PARQUET_ROW_GROUP_SIZE = 256_000
+
+@instrumented
+def load_data(bank_path, academic_path, chunksize=None, format="csv"):
+    """ 
+    Loads banking and academic data from csv, parquet or feather files, the banking data as an iterator of chunks if chunksize is given
+    """
+    bank_data = read_table(bank_path, format=format, chunksize=chunksize)
+    academic_data = read_table(academic_path, format=format)
     return bank_data, academic_data
 
-def clean_bank_data(df):
+def read_table(path, format="csv", columns=None, chunksize=None):
+    """ 
+    Reads a table from csv, or memory-maps it from a parquet dataset or feather file
+    """
+    if format == "csv":
+        return pd.read_csv(path, usecols=columns, chunksize=chunksize)
+    
+    if format not in FILE_FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {list(FILE_FORMATS)}")
+    if chunksize is not None:
+        raise ValueError("chunksize is only supported for csv files")
+    
+    # pyarrow is only needed for the columnar formats
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        
+    return table.to_pandas()
+
+def write_table(df, path, format="csv", partition_cols=None, append=False):
     """ 
-    Cleans banking data and creates features
+    Writes a table to csv, a (optionally partitioned) parquet dataset directory, or a feather file
+    """
+    if format == "csv":
+        df.to_csv(path, mode="a" if append else "w", header=not append, index=False)
+        return
+    
+    if format not in FILE_FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {list(FILE_FORMATS)}")
+    
+    # Repeated strings are stored once per file as dictionaries instead of once per row
+    df = df.copy()
+    for column in DICTIONARY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+            
+    if format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        # Each write adds new part files to the dataset directory, so appends never rewrite old data
+        if not append and os.path.isdir(path):
+            shutil.rmtree(path)
+        pq.write_to_dataset(
+            pa.Table.from_pandas(df, preserve_index=False),
+            path,
+            partition_cols=partition_cols,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            min_rows_per_group=PARQUET_ROW_GROUP_SIZE,
+            max_rows_per_group=PARQUET_ROW_GROUP_SIZE
+        )
+    else:
+        if append:
+            raise ValueError("feather files can't be appended to, use csv or parquet instead")
+        df.reset_index(drop=True).to_feather(path)
+
+# Fixed category orders for the derived columns, so plots and tables come out in a natural order
+TRANSACTION_TYPES = ["Credit", "Debit"]
+DAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTH_ORDER = ["January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+SPENDING_BINS = ["Small (Less than $10)", "Medium ($10-$50)", "Large ($50-$100)", "Very Large (More than $100)"]
+SPENDING_BIN_EDGES = [-np.inf, 10, 50, 100, np.inf]
+PERIOD_TYPES = ["Class Period", "Assessment Period", "Break", "Weekend", "Other"]
+
+def _date_part_categorical(codes, categories):
+    """ 
+    Turns zero-based date part numbers (day of week, month) into a categorical without building any strings
+    """
+    codes = codes.fillna(-1).to_numpy(dtype=np.int8)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+@instrumented
+def clean_bank_data(df, compact=False):
+    """ 
+    Cleans banking data and creates features, in the compact schema if compact is True
     """
     # Convert date to datetime
     df["Date"] = pd.to_datetime(df["Date"])
@@ -40,25 +317,29 @@ def clean_bank_data(df):
     df["Amount"] = df["Amount"].astype(float)
     
     # Create debit (negative) and credit (positive) flags based on amount
-    df["Transaction_Type"] = df["Amount"].apply(
-        lambda amount: "Debit" if amount < 0 else "Credit"
+    df["Transaction_Type"] = pd.Categorical.from_codes(
+        (df["Amount"] < 0).to_numpy(dtype=np.int8), categories=TRANSACTION_TYPES
     )
     
     # Absolute amount column
     df["Absolute_Amount"] = df["Amount"].abs()
     
     # Extract day of the week and month
-    df["Day_of_Week"] = df["Date"].dt.day_name()
-    df["Month"] = df["Date"].dt.strftime("%B")
+    df["Day_of_Week"] = _date_part_categorical(df["Date"].dt.dayofweek, DAY_ORDER)
+    df["Month"] = _date_part_categorical(df["Date"].dt.month - 1, MONTH_ORDER)
     
     # Create transaction categories
-    df["Category"] = df["Description"].apply(categorize_transaction)
+    df["Category"] = categorize_transactions(df["Description"])
     
     # Create spending bins
-    df["Spending_Bin"] = df["Absolute_Amount"].apply(create_spending_bins)
+    df["Spending_Bin"] = pd.cut(df["Absolute_Amount"], bins=SPENDING_BIN_EDGES, labels=SPENDING_BINS, right=False)
+    
+    if compact:
+        return compact_frame(df, compact_dates=False)
     
     return df
     
+@instrumented
 def clean_academic_data(df):
     """ 
     Cleans academic data and create features
@@ -67,107 +348,202 @@ def clean_academic_data(df):
     df["date"] = pd.to_datetime(df["date"])
     
     # Extract day of week
-    df["day_of_week"] = df["date"].dt.day_name()
+    df["day_of_week"] = _date_part_categorical(df["date"].dt.dayofweek, DAY_ORDER)
     
     # Create period type
-    df["period_type"] = df.apply(
-        lambda row: get_period_type(row["academic_event_type"], row["class_activity"]), axis=1
-    )
+    df["period_type"] = get_period_types(df["academic_event_type"], df["class_activity"])
     
     return df
     
-def categorize_transaction(description):
+# Free-text and repeated string columns that the compact schema stores as categoricals
+COMPACT_CATEGORY_COLUMNS = ["Description", "Type", "Status", "academic_event_type", "class_activity"]
+
+# Float money columns the compact schema replaces with integer cents
+COMPACT_CENTS_COLUMNS = {"Amount": "Amount_Cents", "Current balance": "Current_Balance_Cents"}
+
+def _compact_date_dtype():
     """ 
-    Categorizes transactions based on description
+    Uses Arrow date32 (4 bytes per row) when pyarrow is installed, otherwise second-resolution datetimes
     """
-    description = description.lower()
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "datetime64[s]"
+    return "date32[pyarrow]"
+
+def _to_cents(amounts):
+    """ 
+    Converts dollar amounts to integer cents, nullable only when some amounts are missing
+    """
+    cents = (amounts.astype(float) * 100).round()
+    return cents.astype("Int64" if cents.isna().any() else np.int64)
+
+def money_column(df, column):
+    """ 
+    Dollar amounts of a money column (or of one record) as floats, read from integer cents in compact frames
+    """
+    cents_column = COMPACT_CENTS_COLUMNS.get(column)
+    if column in df:
+        values = pd.to_numeric(df[column])
+    elif cents_column in df:
+        values = pd.to_numeric(df[cents_column]) / 100
+    else:
+        raise KeyError(f"Neither {column!r} nor {cents_column!r} is in the data")
+    return values.astype(float) if isinstance(values, pd.Series) else float(values)
+
+@instrumented
+def compact_frame(df, compact_dates=True):
+    """ 
+    Converts a cleaned banking or merged frame to the compact schema
     
-    # Make sure safeway fuel doesn't end up in groceries category
-    if "safeway fuel" in description:
-        return "Transportation"
+    Strings become categoricals, Amount and Current balance become integer cents, Date becomes date32
+    and the calendar's day_of_week is dropped since it repeats Day_of_Week. Code that reads Amount or
+    Current balance should go through money_column, which reads either schema.
+    """
+    df = df.copy()
+    
+    # Derived columns read back from a file get their fixed category orders back
+    ordered_columns = {"Transaction_Type": TRANSACTION_TYPES, "Day_of_Week": DAY_ORDER, "Month": MONTH_ORDER,
+                       "Category": CATEGORIES, "Spending_Bin": SPENDING_BINS, "period_type": PERIOD_TYPES}
+    for column in COMPACT_CATEGORY_COLUMNS + list(ordered_columns):
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = pd.Categorical(df[column], categories=ordered_columns.get(column))
+            
+    # Replace each money column in place so the column order stays the same
+    for column, cents_column in COMPACT_CENTS_COLUMNS.items():
+        if column in df.columns:
+            df.insert(df.columns.get_loc(column), cents_column, _to_cents(df.pop(column)))
+            
+    if "day_of_week" in df.columns and "Day_of_Week" in df.columns:
+        df = df.drop(columns="day_of_week")
+        
+    # Dates stay datetime64 until after the calendar join, which matches on them
+    if compact_dates and "Date" in df.columns:
+        df["Date"] = df["Date"].astype(_compact_date_dtype())
+        
+    return df
+
+def memory_report(before_df, after_df):
+    """ 
+    Compares the in-memory size of two versions of a frame per column, in bytes per row
+    """
+    before = before_df.memory_usage(deep=True, index=False) / max(len(before_df), 1)
+    after = after_df.memory_usage(deep=True, index=False) / max(len(after_df), 1)
+    
+    # Columns only one version has count as zero bytes in the other
+    report = pd.DataFrame({"before_bytes_per_row": before, "after_bytes_per_row": after}).fillna(0)
+    report.loc["Total"] = report.sum()
+    report["ratio"] = report["after_bytes_per_row"] / report["before_bytes_per_row"]
+    return report.round(2)
     
+# Make sure safeway fuel doesn't end up in groceries category
+FUEL_OVERRIDE_KEYWORD = "safeway fuel"
+
+# Keyword lists checked in order, the first category with a matching keyword wins
+CATEGORY_KEYWORDS = [
     # Dining out and food/snacks
-    dining_keywords = ["daves", "starbucks", "jersey", "chick", "kfc", "taco", 
-                       "panda", "cookie", "thomas hammer", "chipotle", "mango", 
-                       "domino", "qdoba", "caruso", "mizuna", "ramen", "mcdonald", 
-                       "coffee", "lebanon", "teriyaki", "brew", "thai", "bistro", 
-                       "crumbl", "wing", "cstore"]
+    ("Dining", ["daves", "starbucks", "jersey", "chick", "kfc", "taco",
+                "panda", "cookie", "thomas hammer", "chipotle", "mango",
+                "domino", "qdoba", "caruso", "mizuna", "ramen", "mcdonald",
+                "coffee", "lebanon", "teriyaki", "brew", "thai", "bistro",
+                "crumbl", "wing", "cstore"]),
+    
+    # Transportation and gas
+    ("Transportation", ["maverik", "fuel", "exxon", "conoc", "marathon petro",
+                        "gas", "wsdot"]),
     
     # Grocery stores
-    grocery_keywords = ["groceries", "market", "huckleberry", "costco", "safeway",
-                        "trader joe", "wm superc", "fred"]
+    ("Groceries", ["groceries", "market", "huckleberry", "costco", "safeway",
+                   "trader joe", "wm superc", "fred"]),
     
     # Retail and general shopping
-    retail_keywords = ["target", "dicks", "amazon", "etsy", "petsmart", "petco",
-                       "diamond beauty", "heart of gold", "riot"]
-    
-    # Transportation and gas
-    transport_keywords = ["maverik", "fuel", "exxon", "conoc", "marathon petro",
-                          "gas", "wsdot"]
+    ("Retail", ["target", "dicks", "amazon", "etsy", "petsmart", "petco",
+                "diamond beauty", "heart of gold", "riot"]),
     
     # Utilities and bills
-    utilities_keywords = ["comcast", "cashnet", "city of spokane"]
+    ("Utilities", ["comcast", "cashnet", "city of spokane"]),
     
     # Banking and financial
-    banking_keywords = ["zelle", "interest earned", "robinhood",
-                        "venmo", "mobile check deposit"]
+    ("Banking & Investments", ["zelle", "interest earned", "robinhood",
+                               "venmo", "mobile check deposit"]),
     
     # Subscriptions
-    subscription_keywords = ["subscr"]
+    ("Subscriptions", ["subscr"]),
     
     # Parking
-    parking_keywords = ["parkrite", "diamond parking", "pmusa"]
+    ("Parking", ["parkrite", "diamond parking", "pmusa"]),
     
     # Rent
-    rent_keywords = ["cooper george"]
-    
-    # Check dining keywords
-    for keyword in dining_keywords:
-        if keyword in description:
-            return "Dining"
-    
-    # Check transportation keywords
-    for keyword in transport_keywords:
-        if keyword in description:
-            return "Transportation"
-        
-    # Check grocery keywords
-    for keyword in grocery_keywords:
-        if keyword in description:
-            return "Groceries"
-        
-    # Check retail keywords
-    for keyword in retail_keywords:
-        if keyword in description:
-            return "Retail"
-        
-    # Check utilities keywords
-    for keyword in utilities_keywords:
-        if keyword in description:
-            return "Utilities"
-        
-    # Check banking keywords
-    for keyword in banking_keywords:
-        if keyword in description:
-            return "Banking & Investments"
-        
-    # Check subscription keywords
-    for keyword in subscription_keywords:
-        if keyword in description:
-            return "Subscriptions"
-        
-    # Check parking keywords
-    for keyword in parking_keywords:
-        if keyword in description:
-            return "Parking"
-        
-    # Check rent keywords
-    for keyword in rent_keywords:
-        if keyword in description:
-            return "Rent"
+    ("Rent", ["cooper george"]),
+]
+
+# Every category categorize_transaction can return, in precedence order
+CATEGORIES = [category for category, _ in CATEGORY_KEYWORDS] + ["Other"]
+
+@instrumented
+def categorize_transaction(description):
+    """ 
+    Categorizes transactions based on description
+    """
+    description = description.lower()
+    
+    # Make sure safeway fuel doesn't end up in groceries category
+    if FUEL_OVERRIDE_KEYWORD in description:
+        return "Transportation"
+    
+    # Check each category's keywords in order
+    for category, keywords in CATEGORY_KEYWORDS:
+        for keyword in keywords:
+            if keyword in description:
+                return category
         
     # If theres no match
     return "Other"
+
+def _compile_category_patterns():
+    """ 
+    Builds one regex alternation per category, keeping the precedence of categorize_transaction
+    """
+    patterns = [("Transportation", re.escape(FUEL_OVERRIDE_KEYWORD))]
+    for category, keywords in CATEGORY_KEYWORDS:
+        patterns.append((category, "|".join(re.escape(keyword) for keyword in keywords)))
+    return patterns
+
+def _fast_string_dtype():
+    """ 
+    Uses Arrow-backed strings when pyarrow is installed, since their regex matching runs in C++
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return object
+    return "string[pyarrow]"
+
+@instrumented
+def categorize_transactions(descriptions):
+    """ 
+    Categorizes a whole column of descriptions at once, matching categorize_transaction row for row
+    """
+    descriptions = pd.Series(descriptions)
+    
+    # Bank exports repeat the same merchants constantly, so only categorize each distinct description once
+    codes, uniques = pd.factorize(descriptions)
+    lowered = pd.Series(uniques, dtype=_fast_string_dtype()).str.lower()
+    
+    # Walk the categories from lowest to highest precedence so earlier categories overwrite later ones
+    other_code = CATEGORIES.index("Other")
+    category_codes = np.full(len(lowered), other_code, dtype=np.int8)
+    for category, pattern in reversed(_compile_category_patterns()):
+        matches = lowered.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+        category_codes[matches] = CATEGORIES.index(category)
+        
+    # Missing descriptions get -1 from factorize and are left as "Other"
+    result = np.full(len(codes), other_code, dtype=np.int8)
+    found = codes >= 0
+    result[found] = category_codes[codes[found]]
+    
+    return pd.Series(pd.Categorical.from_codes(result, categories=CATEGORIES),
+                     index=descriptions.index, name=descriptions.name)
     
 def create_spending_bins(amount):
     """ 
@@ -204,45 +580,618 @@ def get_period_type(event_type, class_activity):
     else:
         return "Other"
     
-def merge_datasets(bank_df, academic_df, output_filename="merged_data.csv"):
+@instrumented
+def get_period_types(event_types, class_activities):
+    """ 
+    Categorizes whole columns of academic period types at once, matching get_period_type row for row
+    """
+    event_types = pd.Series(event_types).str.lower()
+    class_activities = pd.Series(class_activities).str.lower()
+    
+    def contains(values, *keywords):
+        matches = values.str.contains(keywords[0], regex=False)
+        for keyword in keywords[1:]:
+            matches |= values.str.contains(keyword, regex=False)
+        return matches.fillna(False).to_numpy(dtype=bool)
+    
+    # Same checks as get_period_type, np.select picks the first one that matches
+    conditions = [
+        contains(class_activities, "exam") | contains(event_types, "exam", "finals week"),
+        contains(class_activities, "quiz"),
+        contains(event_types, "break", "holiday", "vacation"),
+        contains(event_types, "weekend"),
+        contains(event_types, "study day"),
+        contains(class_activities, "lecture")
+    ]
+    period_names = ["Assessment Period", "Assessment Period", "Break", "Weekend", "Assessment Period", "Class Period"]
+    codes = np.select(conditions, [PERIOD_TYPES.index(name) for name in period_names],
+                      default=PERIOD_TYPES.index("Other"))
+    
+    return pd.Series(pd.Categorical.from_codes(codes, categories=PERIOD_TYPES), index=event_types.index)
+    
+def calendar_intervals_from_daily(academic_df, calendar_id=None):
+    """ 
+    Compresses a cleaned day-by-day academic calendar into (start, end, event type, activity) intervals
+    """
+    daily = academic_df.sort_values("date")
+    event_types = daily["academic_event_type"].astype(object)
+    activities = daily["class_activity"].astype(object)
+    
+    # A new interval starts whenever the day isn't the next one or the event or activity changes
+    new_interval = (
+        (daily["date"].diff() != pd.Timedelta(days=1))
+        | (event_types != event_types.shift())
+        | (activities != activities.shift())
+    )
+    interval_ids = new_interval.cumsum()
+    
+    intervals = daily.groupby(interval_ids).agg(
+        start=("date", "first"),
+        end=("date", "last"),
+        academic_event_type=("academic_event_type", "first"),
+        class_activity=("class_activity", "first")
+    ).reset_index(drop=True)
+    
+    if calendar_id is not None:
+        intervals.insert(0, "calendar_id", calendar_id)
+    return intervals
+
+def build_calendar_index(intervals, id_column="calendar_id"):
+    """ 
+    Builds a sorted lookup of calendar intervals for each calendar id, without expanding them to single days
+    """
+    intervals = intervals.rename(columns={"event_type": "academic_event_type"})
+    intervals = intervals.assign(
+        start=pd.to_datetime(intervals["start"]).dt.normalize(),
+        end=pd.to_datetime(intervals["end"]).dt.normalize()
+    )
+    intervals["period_type"] = get_period_types(intervals["academic_event_type"], intervals["class_activity"]).array
+    
+    # Without an id column everything is one calendar, looked up under the key None
+    if id_column in intervals.columns:
+        calendars = intervals.groupby(id_column, sort=False)
+    else:
+        calendars = [(None, intervals)]
+        
+    calendar_index = {}
+    for calendar_key, calendar in calendars:
+        calendar = calendar.sort_values("start").reset_index(drop=True)
+        starts = calendar["start"].to_numpy(dtype="datetime64[ns]")
+        ends = calendar["end"].to_numpy(dtype="datetime64[ns]")
+        
+        # searchsorted only finds the right interval if they don't overlap
+        if (ends < starts).any() or (starts[1:] <= ends[:-1]).any():
+            raise ValueError(f"Calendar {calendar_key!r} has overlapping or reversed intervals")
+        
+        calendar_index[calendar_key] = {
+            "starts": starts,
+            "ends": ends,
+            "attributes": calendar[["academic_event_type", "class_activity", "period_type"]]
+        }
+        
+    return calendar_index
+
+def join_calendar_intervals(bank_df, calendar_index, calendar_id=None, id_column="calendar_id"):
+    """ 
+    Joins cleaned banking data to calendar intervals with a binary search per transaction, O(n log n + n log m)
+    """
+    merged_df = bank_df.copy()
+    dates = pd.to_datetime(merged_df["Date"]).dt.normalize().to_numpy(dtype="datetime64[ns]")
+    
+    # Each transaction uses its own row's calendar when the bank data has an id column
+    if id_column in merged_df.columns:
+        key_codes, calendar_keys = pd.factorize(merged_df[id_column].to_numpy(dtype=object))
+    else:
+        key_codes, calendar_keys = np.zeros(len(merged_df), dtype=np.intp), [calendar_id]
+        
+    # Group the row numbers by calendar with one sort; missing ids have code -1, sort first and are never looked up
+    order = np.argsort(key_codes, kind="stable")
+    bounds = np.searchsorted(key_codes[order], np.arange(len(calendar_keys) + 1))
+    
+    event_types = np.full(len(merged_df), np.nan, dtype=object)
+    activities = np.full(len(merged_df), np.nan, dtype=object)
+    period_codes = np.full(len(merged_df), -1, dtype=np.int8)
+    
+    for i, calendar_key in enumerate(calendar_keys):
+        calendar = calendar_index.get(calendar_key)
+        if calendar is None:
+            continue
+        rows = order[bounds[i]:bounds[i + 1]]
+        
+        # The candidate is the last interval starting on or before the date, it matches if it hasn't ended yet
+        positions = np.searchsorted(calendar["starts"], dates[rows], side="right") - 1
+        matched = (positions >= 0) & (dates[rows] <= calendar["ends"][np.maximum(positions, 0)])
+        rows = rows[matched]
+        positions = positions[matched]
+        
+        attributes = calendar["attributes"]
+        event_types[rows] = attributes["academic_event_type"].to_numpy(dtype=object)[positions]
+        activities[rows] = attributes["class_activity"].to_numpy(dtype=object)[positions]
+        period_codes[rows] = attributes["period_type"].cat.codes.to_numpy()[positions]
+        
+    merged_df["academic_event_type"] = event_types
+    merged_df["class_activity"] = activities
+    
+    # Matched transactions get the calendar day's weekday, unmatched ones stay missing like in the daily merge
+    has_calendar = period_codes >= 0
+    day_codes = np.where(has_calendar, pd.to_datetime(merged_df["Date"]).dt.dayofweek.to_numpy(), -1)
+    merged_df["day_of_week"] = pd.Categorical.from_codes(day_codes.astype(np.int8), categories=DAY_ORDER)
+    merged_df["period_type"] = pd.Categorical.from_codes(period_codes, categories=PERIOD_TYPES)
+    
+    return merged_df
+
+@instrumented
+def join_academic_calendar(bank_df, academic_df):
     """
-    Merges banking and academic datasets and saves the result to a csv file
+    Joins one frame (or chunk) of cleaned banking data to the cleaned academic calendar, either day by day or through a calendar index
     """
+    if isinstance(academic_df, dict):
+        return join_calendar_intervals(bank_df, academic_df)
+    
     merged_df = pd.merge(bank_df, academic_df, left_on="Date", right_on="date", how="left")
     
     # Clean columns
     if "date" in merged_df.columns:
         merged_df.drop(["date"], axis=1, inplace=True)
         
-    # Save the merged DataFrame to a CSV file
-    merged_df.to_csv(output_filename, index=False)
+    return merged_df
+
+def write_merged_chunks(merged_chunks, output_filename="merged_data.csv", format="csv", partition_cols=None):
+    """
+    Writes merged chunks to a file one at a time and returns the number of rows written
+    """
+    rows_written = 0
+    n_chunks = 0
+    for i, merged_chunk in enumerate(merged_chunks):
+        # First chunk creates the file, the rest are appended
+        write_table(merged_chunk, output_filename, format=format, partition_cols=partition_cols, append=(i > 0))
+        rows_written += len(merged_chunk)
+        n_chunks += 1
+        
+    # With no chunks nothing was written, so remove the last run's output rather than leave it looking current
+    if n_chunks == 0:
+        if os.path.isdir(output_filename):
+            shutil.rmtree(output_filename)
+        elif os.path.exists(output_filename):
+            os.remove(output_filename)
+            
+    return rows_written
+
+@instrumented
+def stream_merge_datasets(bank_path, academic_path, output_filename=None, chunksize=100_000, format="csv", partition_cols=None):
+    """
+    Cleans and merges the bank export chunk by chunk so memory stays flat no matter how large it is
+    """
+    if output_filename is None:
+        output_filename = "merged_data" + FILE_FORMATS.get(format, "")
+        
+    # Only one chunk of banking data is held in memory at a time
+    bank_chunks, academic_df = load_data(bank_path, academic_path, chunksize=chunksize)
+    
+    # The academic calendar is small, so it is cleaned once and kept in memory as the lookup side
+    academic_df = clean_academic_data(academic_df)
+    merged_chunks = (join_academic_calendar(clean_bank_data(chunk), academic_df) for chunk in bank_chunks)
+    
+    return write_merged_chunks(merged_chunks, output_filename, format=format, partition_cols=partition_cols)
+
+@instrumented
+def merge_datasets(bank_df, academic_df, output_filename=None, format="csv", partition_cols=None, save=True,
+                   compact=False):
+    """
+    Merges banking and academic datasets and saves the result as csv, parquet or feather (unless save is False)
+    """
+    if output_filename is None:
+        output_filename = "merged_data" + FILE_FORMATS.get(format, "")
+        
+    merged_df = join_academic_calendar(bank_df, academic_df)
+    if compact:
+        merged_df = compact_frame(merged_df)
+    
+    # Save the merged DataFrame to a file
+    if save:
+        write_merged_chunks([merged_df], output_filename, format=format, partition_cols=partition_cols)
     
     return merged_df
     
-def plot_spending_distribution(bank_df, amount_limit=2000):
+# Bump when the cached output changes in a way neither the rules nor the function sources show,
+# such as a pandas upgrade changing dtypes
+PIPELINE_CACHE_VERSION = 2
+
+# Functions that produce the cached tables; editing any of them invalidates the cache
+PIPELINE_CACHE_FUNCTIONS = [
+    "load_data", "read_table", "clean_bank_data", "clean_academic_data", "_date_part_categorical",
+    "categorize_transactions", "_compile_category_patterns", "_fast_string_dtype", "get_period_types",
+    "join_academic_calendar", "join_calendar_intervals", "load_cleaned_data"
+]
+
+# Hit and miss counters for load_cleaned_data, shared across calls in this process
+CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+
+def _file_digest(path, block_size=1 << 20):
+    """ 
+    SHA-256 of a file's contents, read in blocks so large exports aren't loaded at once
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as data_file:
+        for block in iter(lambda: data_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def _pipeline_source_digest():
+    """ 
+    SHA-256 of the source of every function in PIPELINE_CACHE_FUNCTIONS
+    """
+    digest = hashlib.sha256()
+    for name in PIPELINE_CACHE_FUNCTIONS:
+        function = inspect.unwrap(globals()[name])
+        try:
+            digest.update(inspect.getsource(function).encode())
+        except OSError:
+            # Without source files, fall back to the compiled bytecode
+            digest.update(function.__code__.co_code)
+    return digest.hexdigest()
+
+def _rules_fingerprint():
+    """ 
+    Serializes the keyword lists, feature rules and pipeline source, so editing any of them invalidates the cache
+    """
+    rules = {
+        "version": PIPELINE_CACHE_VERSION,
+        "source": _pipeline_source_digest(),
+        "fuel_override": FUEL_OVERRIDE_KEYWORD,
+        "category_keywords": CATEGORY_KEYWORDS,
+        "spending_bins": SPENDING_BINS,
+        "spending_bin_edges": SPENDING_BIN_EDGES,
+        "period_types": PERIOD_TYPES
+    }
+    return json.dumps(rules, sort_keys=True)
+
+def pipeline_cache_key(bank_path, academic_path):
+    """ 
+    Content-addressed cache key from both input files and the categorization rules
+    """
+    digest = hashlib.sha256()
+    for part in (_file_digest(bank_path), _file_digest(academic_path), _rules_fingerprint()):
+        digest.update(part.encode())
+    return digest.hexdigest()
+
+def _evict_cache_entries(cache_dir, max_cache_bytes, keep_path):
+    """ 
+    Deletes least recently used cache entries until the cache fits under max_cache_bytes
+    """
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".pkl")]
+    entries.sort(key=os.path.getmtime)
+    total_bytes = sum(os.path.getsize(entry) for entry in entries)
+    
+    for entry in entries:
+        if total_bytes <= max_cache_bytes:
+            break
+        if entry == keep_path:
+            continue
+        total_bytes -= os.path.getsize(entry)
+        os.remove(entry)
+        CACHE_STATS["evictions"] += 1
+
+@instrumented
+def load_cleaned_data(bank_path, academic_path, cache_dir=".pipeline_cache", max_cache_bytes=1 << 30):
+    """ 
+    Returns cleaned banking, cleaned academic and merged data, from the on-disk cache when the inputs and rules are unchanged
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, pipeline_cache_key(bank_path, academic_path) + ".pkl")
+    
+    if os.path.exists(cache_path):
+        CACHE_STATS["hits"] += 1
+        
+        # Touch the entry so it counts as recently used for eviction
+        os.utime(cache_path)
+        with open(cache_path, "rb") as cache_file:
+            return pickle.load(cache_file)
+        
+    CACHE_STATS["misses"] += 1
+    bank_df, academic_df = load_data(bank_path, academic_path)
+    bank_df = clean_bank_data(bank_df)
+    academic_df = clean_academic_data(academic_df)
+    merged_df = join_academic_calendar(bank_df, academic_df)
+    result = (bank_df, academic_df, merged_df)
+    
+    # Write to a temporary file first so a crash never leaves a half-written entry behind
+    temp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as cache_file:
+        pickle.dump(result, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, cache_path)
+    _evict_cache_entries(cache_dir, max_cache_bytes, keep_path=cache_path)
+    
+    return result
+
+def get_cache_stats():
+    """ 
+    Returns a copy of the cache hit, miss and eviction counters
+    """
+    return dict(CACHE_STATS)
+    
+# Columns that identify a single posting, used to detect duplicates across exports
+FINGERPRINT_COLUMNS = ["Date", "Description", "Amount", "Current balance"]
+
+def transaction_fingerprints(bank_df):
+    """
+    Hashes each transaction's date, description, amount and balance into a stable 64-bit fingerprint
+    """
+    # Normalize first so "-27.00" and "-27", integer cents, or dates in any format or unit hash the same
+    key = pd.DataFrame({
+        "Date": pd.to_datetime(bank_df["Date"]).astype("datetime64[ns]"),
+        "Description": bank_df["Description"].astype(str),
+        "Amount": money_column(bank_df, "Amount"),
+        "Current balance": money_column(bank_df, "Current balance")
+    })
+    return pd.util.hash_pandas_object(key, index=False)
+
+def load_ingest_state(state_path):
+    """
+    Loads the last processed date and the fingerprints of the rows posted on it
+    """
+    if not os.path.exists(state_path):
+        return {"watermark": None, "fingerprints": []}
+    
+    with open(state_path) as state_file:
+        return json.load(state_file)
+
+def save_ingest_state(state, state_path):
+    """
+    Saves the ingest state, replacing the old file only once the new one is fully written
+    """
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, state_path)
+
+@instrumented
+def ingest_incremental(bank_path, academic_path, merged_path=None, state_path="ingest_state.json",
+                       chunksize=100_000, format="csv", partition_cols=None):
+    """
+    Cleans, categorizes and merges only the transactions that are new since the last run and appends them to the merged dataset
+    """
+    if merged_path is None:
+        merged_path = "merged_data" + FILE_FORMATS.get(format, "")
+        
+    state = load_ingest_state(state_path)
+    watermark = pd.Timestamp(state["watermark"]) if state["watermark"] else None
+    seen = set(state["fingerprints"])
+    
+    bank_chunks, academic_df = load_data(bank_path, academic_path, chunksize=chunksize)
+    academic_df = clean_academic_data(academic_df)
+    
+    # Append only to a merged file an earlier run with this state wrote, anything else is replaced.
+    # States saved before merged_path was recorded are assumed to belong to this file
+    previous_path = state.get("merged_path")
+    append = (watermark is not None and os.path.exists(merged_path)
+              and (previous_path is None or os.path.abspath(previous_path) == os.path.abspath(merged_path)))
+    rows_read = 0
+    rows_new = 0
+    new_watermark = watermark
+    latest_fingerprints = set(seen)
+    
+    for chunk in bank_chunks:
+        rows_read += len(chunk)
+        dates = pd.to_datetime(chunk["Date"])
+        
+        # Everything before the watermark was processed by an earlier run
+        if watermark is not None:
+            chunk = chunk[(dates >= watermark).to_numpy()]
+            dates = dates[(dates >= watermark).to_numpy()]
+            
+        # Drop postings already ingested on the watermark day and repeats within this export
+        fingerprints = transaction_fingerprints(chunk)
+        is_new = (~fingerprints.isin(seen) & ~fingerprints.duplicated()).to_numpy()
+        chunk = chunk[is_new]
+        dates = dates[is_new]
+        fingerprints = fingerprints[is_new]
+        seen.update(fingerprints.tolist())
+        
+        if chunk.empty:
+            continue
+        
+        # Only fingerprints from the latest day are needed to dedupe the next run
+        chunk_max = dates.max()
+        if new_watermark is None or chunk_max > new_watermark:
+            new_watermark = chunk_max
+            latest_fingerprints = set()
+        latest_fingerprints.update(fingerprints[(dates == new_watermark).to_numpy()].tolist())
+        
+        merged_chunk = join_academic_calendar(clean_bank_data(chunk), academic_df)
+        write_table(merged_chunk, merged_path, format=format, partition_cols=partition_cols, append=append)
+        append = True
+        rows_new += len(chunk)
+        
+    if new_watermark is not None:
+        save_ingest_state({
+            "watermark": new_watermark.strftime("%Y-%m-%d"),
+            "fingerprints": sorted(latest_fingerprints),
+            "merged_path": os.path.abspath(merged_path)
+        }, state_path)
+        
+    return {
+        "rows_read": rows_read,
+        "rows_new": rows_new,
+        "watermark": new_watermark
+    }
+    
+# Dimensions of the spending cube and the category order used for each
+CUBE_KEYS = {"Category": CATEGORIES, "Day_of_Week": DAY_ORDER, "Month": MONTH_ORDER, "period_type": PERIOD_TYPES}
+
+@instrumented
+def build_spending_cube(df):
+    """ 
+    Aggregates debit spending by category, day, month and academic period in a single pass
+    """
+    debit_data = df[df["Transaction_Type"] == "Debit"]
+    keys = [key for key in CUBE_KEYS if key in debit_data.columns]
+    amounts = debit_data["Absolute_Amount"].to_numpy(dtype=float)
+    
+    # Combine each key's codes into one cell number, missing values get their own slot at code 0
+    key_codes = []
+    key_categories = []
+    for key in keys:
+        column = debit_data[key]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            values = column.array
+        else:
+            values = pd.Categorical(column, categories=CUBE_KEYS[key])
+        key_codes.append(values.codes.astype(np.int64) + 1)
+        key_categories.append(values.categories)
+    dims = [len(categories) + 1 for categories in key_categories]
+    flat_cells = np.ravel_multi_index(key_codes, dims) if keys else np.zeros(len(amounts), dtype=np.int64)
+    cell_numbers, cell_ids = np.unique(flat_cells, return_inverse=True)
+    
+    # Sufficient statistics for every cell
+    statistics = pd.DataFrame({
+        "cell": cell_ids,
+        "amount": amounts,
+        "amount_sq": amounts ** 2,
+        "date": debit_data["Date"].to_numpy()
+    }).groupby("cell").agg(
+        count=("amount", "size"),
+        sum=("amount", "sum"),
+        sum_sq=("amount_sq", "sum"),
+        min=("amount", "min"),
+        max=("amount", "max"),
+        first_date=("date", "min")
+    ).reset_index(drop=True)
+    
+    # Decode the cell numbers back into key values
+    cell_keys = pd.DataFrame({
+        key: pd.Categorical.from_codes(codes - 1, categories=categories)
+        for key, codes, categories in zip(keys, np.unravel_index(cell_numbers, dims), key_categories)
+    }, index=statistics.index)
+    cells = pd.concat([cell_keys, statistics], axis=1)
+            
+    # How often each distinct amount occurs per cell, which gives exact quantiles
+    # Prices repeat, so this grows with the distinct amounts in each cell rather than with rows
+    amount_counts = pd.DataFrame({"cell": cell_ids, "amount": amounts}).groupby(
+        ["cell", "amount"]
+    ).size().rename("count").reset_index()
+    
+    return {"keys": keys, "cells": cells, "amount_counts": amount_counts}
+
+def _cube_rollup(cube, by=None, observed=True):
+    """ 
+    Rolls the cube up to the given keys and returns count, sum, mean, std, min, max and first date for each group
+    """
+    cells = cube["cells"]
+    if by is None:
+        grouped = cells.assign(_all=0).groupby("_all")
+    else:
+        grouped = cells.groupby(by, observed=observed)
+        
+    rollup = grouped.agg(
+        count=("count", "sum"),
+        sum=("sum", "sum"),
+        sum_sq=("sum_sq", "sum"),
+        min=("min", "min"),
+        max=("max", "max"),
+        first_date=("first_date", "min")
+    )
+    
+    # Empty groups (observed=False) have count 0, so their mean and std come out missing like a groupby would
+    counts = rollup["count"].where(rollup["count"] > 0)
+    rollup["mean"] = rollup["sum"] / counts
+    rollup["std"] = np.sqrt(((rollup["sum_sq"] - rollup["sum"] ** 2 / counts) / (counts - 1)).clip(lower=0))
+    
+    return rollup
+
+def _counted_quantile(values, counts, q):
+    """ 
+    Exact q-th quantile of sorted distinct values with their counts, interpolating between ranks like pandas does
+    """
+    cumulative = np.cumsum(counts)
+    position = q * (cumulative[-1] - 1)
+    ranks = np.array([np.floor(position), np.ceil(position)])
+    
+    # The value at each rank is the first one whose running count passes it
+    lower, upper = values[np.searchsorted(cumulative, ranks, side="right")]
+    fraction = position - ranks[0]
+    return (1 - fraction) * lower + fraction * upper
+
+def _cube_quantile(cube, q=0.5, by=None):
+    """ 
+    Exact q-th quantile of spending overall or for each group from the cube's amount counts
+    """
+    amount_counts = cube["amount_counts"]
+    if by is None:
+        if amount_counts.empty:
+            return np.nan
+        counts = amount_counts.groupby("amount")["count"].sum()
+        return _counted_quantile(counts.index.to_numpy(), counts.to_numpy(), q)
+    
+    by_columns = [by] if isinstance(by, str) else list(by)
+    group_keys = cube["cells"][by_columns].iloc[amount_counts["cell"]].reset_index(drop=True)
+    counts = pd.concat([group_keys, amount_counts[["amount", "count"]]], axis=1)
+    counts = counts.groupby(by_columns + ["amount"], observed=True)["count"].sum().reset_index()
+    
+    # Groups are few after rolling up, so each one's counts are handled on their own
+    quantiles = {}
+    for group_key, group in counts.groupby(by_columns, observed=True):
+        quantiles[group_key] = _counted_quantile(group["amount"].to_numpy(), group["count"].to_numpy(), q)
+        
+    if len(by_columns) > 1:
+        index = pd.MultiIndex.from_tuples(quantiles.keys(), names=by_columns)
+    else:
+        index = pd.Index([key[0] for key in quantiles.keys()], name=by_columns[0])
+    return pd.Series(list(quantiles.values()), index=index, dtype=float)
+    
+def _finish_figure(fig, output_path=None, show=True, keep=True):
+    """ 
+    Saves and closes a finished figure when given a path, otherwise shows it, or hands it back when show is False
+    """
+    import matplotlib.pyplot as plt
+    
+    if output_path is not None:
+        fig.savefig(output_path, bbox_inches="tight")
+        plt.close(fig)
+        return output_path
+    
+    if show:
+        # Returning a shown figure would make notebooks draw it a second time as the cell's value
+        plt.show()
+        return None
+    if not keep:
+        # The caller doesn't hand the figure back, so one that is neither saved nor shown would only leak
+        plt.close(fig)
+        return None
+    return fig
+
+@instrumented
+def plot_spending_distribution(bank_df, amount_limit=2000, output_path=None, show=True):
     """ 
     Plots spending distribution as a histogram
     """
+    import matplotlib.pyplot as plt
+    
     debit_data = bank_df[bank_df["Transaction_Type"] == "Debit"]
     
     # Filter data based on limit
     filtered_data = debit_data[debit_data["Absolute_Amount"] <= amount_limit]
     
-    plt.figure(figsize=(10, 6))
+    fig = plt.figure(figsize=(10, 6))
     plt.hist(debit_data["Absolute_Amount"], bins=50, edgecolor="black")
     plt.title("Distribution of Spending Amounts", fontsize=16)
     plt.xlabel("Amount ($)", fontsize=12)
     plt.ylabel("Frequency", fontsize=12)
     plt.xlim(0, amount_limit)
     plt.grid(axis="y", alpha=0.3)
-    plt.show()
+    return _finish_figure(fig, output_path, show)
     
-def plot_spending_by_category(bank_df):
+@instrumented
+def plot_spending_by_category(bank_df, cube=None, output_path=None, show=True):
     """ 
     Plots total spending by category with a pie chart
     """
-    debit_data = bank_df[bank_df["Transaction_Type"] == "Debit"]
-    spending_by_category = debit_data.groupby("Category")["Absolute_Amount"].sum().sort_values(ascending=False)
+    import matplotlib.pyplot as plt
+    
+    if cube is None:
+        cube = build_spending_cube(bank_df)
+    spending_by_category = _cube_rollup(cube, "Category")["sum"].rename("Absolute_Amount").sort_values(ascending=False)
     
     # Calculate total spending for the title
     total_spent = spending_by_category.sum()
@@ -255,7 +1204,7 @@ def plot_spending_by_category(bank_df):
     # More informative labels with amounts
     labels = [f"{cat}\n${amt:.2f}" for cat, amt in zip(spending_by_category.index, spending_by_category)]
     
-    plt.figure(figsize=(14, 10))
+    fig = plt.figure(figsize=(14, 10))
     wedges, texts, autotexts = plt.pie(
         spending_by_category, 
         labels=None,
@@ -285,19 +1234,22 @@ def plot_spending_by_category(bank_df):
     
     plt.axis("equal")
     plt.tight_layout()
-    plt.show()
+    return _finish_figure(fig, output_path, show)
     
-def plot_spending_by_day(bank_df):
+@instrumented
+def plot_spending_by_day(bank_df, cube=None, output_path=None, show=True):
     """ 
     Plots average spending by day of the week
     """
-    debit_data = bank_df[bank_df["Transaction_Type"] == "Debit"]
-    spending_by_day = debit_data.groupby("Day_of_Week")["Absolute_Amount"].mean()
+    import matplotlib.pyplot as plt
     
-    day_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    spending_by_day = spending_by_day.reindex(day_order)
+    if cube is None:
+        cube = build_spending_cube(bank_df)
+        
+    # Day_of_Week is categorical, so every day shows up in Monday to Sunday order
+    spending_by_day = _cube_rollup(cube, "Day_of_Week", observed=False)["mean"].rename("Absolute_Amount")
     
-    plt.figure(figsize=(12, 6))
+    fig = plt.figure(figsize=(12, 6))
     spending_by_day.plot(kind="bar", color="lightcoral", edgecolor="black")
     plt.title("Average Spending by Day of Week", fontsize=16)
     plt.xlabel("Day of Week", fontsize=12)
@@ -305,16 +1257,21 @@ def plot_spending_by_day(bank_df):
     plt.xticks(rotation=45)
     plt.grid(axis="y", alpha=0.3)
     plt.tight_layout()
-    plt.show()
+    return _finish_figure(fig, output_path, show)
     
-def plot_spending_by_period(merged_df):
+@instrumented
+def plot_spending_by_period(merged_df, cube=None, output_path=None, show=True):
     """ 
-    Plots average spending by academic period
+    Plots average (median) spending by academic period
     """
-    merged_debit = merged_df[merged_df["Transaction_Type"] == "Debit"]
-    spending_by_period = merged_debit.groupby("period_type")["Absolute_Amount"].median()
+    import matplotlib.pyplot as plt
+    
+    if cube is None:
+        cube = build_spending_cube(merged_df)
+    # Same values and alphabetical order as the period statistics
+    spending_by_period = _sorted_labels(_cube_quantile(cube, 0.5, by="period_type")).rename("Absolute_Amount")
     
-    plt.figure(figsize=(10, 6))
+    fig = plt.figure(figsize=(10, 6))
     spending_by_period.plot(kind="bar", color="lightgreen", edgecolor="black")
     plt.title("Average Spending by Academic Period", fontsize=16)
     plt.xlabel("Academic Period Type", fontsize=12)
@@ -322,88 +1279,616 @@ def plot_spending_by_period(merged_df):
     plt.xticks(rotation=45)
     plt.grid(axis="y", alpha=0.3)
     plt.tight_layout()
-    plt.show()
+    return _finish_figure(fig, output_path, show)
     
-def get_spending_statistics(bank_df):
+def _sorted_labels(frame, axis=0):
     """ 
-    Returns key statistics about my spending patterns
+    Puts categorical row (or column) labels back in the sorted order a groupby on plain strings gives
     """
-    debit_data = bank_df[bank_df["Transaction_Type"] == "Debit"]
+    labels = frame.axes[axis].astype(object)
+    frame = frame.set_axis(labels, axis=axis)
+    return frame.reindex(sorted(labels), axis=axis)
+
+@instrumented
+def get_spending_statistics(bank_df, cube=None):
+    """ 
+    Returns key statistics about my spending patterns, all of them read from the cube without rescanning raw rows
+    """
+    if cube is None:
+        cube = build_spending_cube(bank_df)
+        
+    # Reindexing keeps a row of missing values when there is no spending at all
+    overall = _cube_rollup(cube).reindex([0]).iloc[0]
     stats = {
-        "average": debit_data["Absolute_Amount"].mean(),
-        "median": debit_data["Absolute_Amount"].median(),
-        "max": debit_data["Absolute_Amount"].max(),
-        "min": debit_data["Absolute_Amount"].min(),
-        "total": debit_data["Absolute_Amount"].sum(),
-        "count": debit_data.shape[0]
+        "average": overall["mean"],
+        "median": _cube_quantile(cube, 0.5),
+        "max": overall["max"],
+        "min": overall["min"],
+        "total": np.nan_to_num(overall["sum"]),
+        "count": int(np.nan_to_num(overall["count"]))
     }
     
     # Top categories
-    top_categories = debit_data.groupby("Category")["Absolute_Amount"].sum().sort_values(ascending=False)
+    top_categories = _cube_rollup(cube, "Category")["sum"].rename("Absolute_Amount").sort_values(ascending=False)
     stats["top_categories"] = top_categories
     
     # Daily spending averages
-    day_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    daily_avg = debit_data.groupby("Day_of_Week")["Absolute_Amount"].mean().reindex(day_order)
+    daily_avg = _cube_rollup(cube, "Day_of_Week", observed=False)["mean"].rename("Absolute_Amount")
     stats["daily_avg"] = daily_avg
     
     return stats
 
-def plot_monthly_spending(bank_df):
+# Trailing windows, in days, of the rolling spend columns and of the burn rate
+ROLLING_WINDOWS = [7, 30]
+BURN_RATE_WINDOW = 30
+
+def _daily_flows(bank_df):
     """ 
-    Plots spending trends over the 7 months
+    Sums debit spending, credit income and transaction counts per calendar day
     """
-    debit_data = bank_df[bank_df["Transaction_Type"] == "Debit"]
-    monthly_spending = debit_data.groupby("Month")["Absolute_Amount"].sum()
-    month_order = ["November", "December", "January", "February", "March", "April"]
-    monthly_spending = monthly_spending.reindex(month_order)
-    
-    plt.figure(figsize=(12, 6))
-    monthly_spending.plot(kind="bar", color="lightblue", edgecolor="black")
-    plt.title("Total Monthly Spending", fontsize=16)
-    plt.xlabel("Month", fontsize=12)
-    plt.ylabel("Total Spending ($)", fontsize=12)
-    plt.xticks(rotation=45)
-    plt.grid(axis="y", alpha=0.3)
+    dates = pd.to_datetime(bank_df["Date"]).dt.normalize().to_numpy(dtype="datetime64[ns]")
+    amounts = bank_df["Absolute_Amount"].to_numpy(dtype=float)
+    is_debit = (bank_df["Transaction_Type"] == "Debit").to_numpy()
+    
+    flows = pd.DataFrame({
+        "spend": np.where(is_debit, amounts, 0.0),
+        "income": np.where(is_debit, 0.0, amounts),
+        "transactions": np.ones(len(amounts), dtype=np.int64)
+    }, index=pd.DatetimeIndex(dates, name="Date")).groupby(level=0).sum()
+    
+    # Days without transactions are real zero-spend days, not missing ones
+    return flows.resample("D").sum()
+
+def _add_rolling_columns(daily):
+    """ 
+    Adds the trailing window sums and means of spend, and the 30-day burn rate, in one vectorized pass
+    """
+    for window in ROLLING_WINDOWS:
+        rolling = daily["spend"].rolling(window, min_periods=1)
+        daily[f"spend_{window}d_sum"] = rolling.sum()
+        daily[f"spend_{window}d_mean"] = rolling.mean()
+        
+    # Average net outflow per day over the burn rate window, negative when income outpaces spending
+    daily["burn_rate"] = (daily["spend"] - daily["income"]).rolling(BURN_RATE_WINDOW, min_periods=1).mean()
+    return daily
+
+@instrumented
+def build_spending_series(bank_df):
+    """ 
+    Builds the daily spending series over a full DatetimeIndex, with rolling sums, means and burn rate
+    """
+    return _add_rolling_columns(_daily_flows(bank_df))
+
+@instrumented
+def update_spending_series(series, new_bank_df):
+    """ 
+    Adds newly arrived transactions to a daily spending series, recomputing only the rolling windows they touch
+    """
+    if len(new_bank_df) == 0:
+        return series
+    
+    new_flows = _daily_flows(new_bank_df)
+    flow_columns = ["spend", "income", "transactions"]
+    flows = series[flow_columns].add(new_flows, fill_value=0).resample("D").sum()
+    flows["transactions"] = flows["transactions"].astype(np.int64)
+    
+    # Rolling values before the first changed day stay the same; recompute from one full window earlier.
+    # Zero-spend days filled in between the old end and the new data count as changed too
+    if len(series) and new_flows.index[0] > series.index[0]:
+        first_changed = min(new_flows.index[0], series.index[-1] + pd.Timedelta(days=1))
+        context_start = first_changed - pd.Timedelta(days=max(ROLLING_WINDOWS + [BURN_RATE_WINDOW]) - 1)
+        tail = _add_rolling_columns(flows.loc[context_start:].copy()).loc[first_changed:]
+        return pd.concat([series.loc[:first_changed - pd.Timedelta(days=1)], tail])
+    
+    return _add_rolling_columns(flows)
+
+def spending_series_totals(series, freq="MS"):
+    """ 
+    Totals the daily spending series into weekly ("W") or monthly ("MS") spend, income and transactions
+    """
+    return series[["spend", "income", "transactions"]].resample(freq).sum()
+
+# Transactions are dated to the day, so the detector works in whole days since the epoch
+DAY_NANOSECONDS = 86_400_000_000_000
+
+# Default settings of the streaming anomaly detector
+ANOMALY_SETTINGS = {
+    "alpha": 0.05,              # EWMA weight of the newest observation
+    "z_threshold": 4.0,         # |z-score| of log amount above which a debit is flagged
+    "robust_threshold": 5.0,    # |robust z-score| (median/MAD) above which a debit is flagged
+    "warmup": 8,                # debits a category needs before it can flag anything
+    "alert_days": 7             # alert when the balance is projected to reach zero within this many days
+}
+
+def new_anomaly_state(**settings):
+    """ 
+    Creates the constant-size state of the streaming anomaly detector
+    """
+    unknown = set(settings) - set(ANOMALY_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown anomaly settings: {sorted(unknown)}")
+    
+    return {
+        "settings": {**ANOMALY_SETTINGS, **settings},
+        "categories": {},
+        "balance": {"day": None, "balance": None, "daily_change": None}
+    }
+
+def _update_category(stats, value, settings):
+    """ 
+    Scores one log amount against its category and then folds it into the category's EWMA and median/MAD
+    """
+    alpha = settings["alpha"]
+    z = robust_z = math.nan
+    
+    if stats["count"] >= settings["warmup"]:
+        # Score before updating, so an outlier can't hide itself
+        if stats["var"] > 0:
+            z = (value - stats["mean"]) / math.sqrt(stats["var"])
+        if stats["mad"] > 0:
+            robust_z = 0.6745 * (value - stats["median"]) / stats["mad"]
+            
+    stats["count"] += 1
+    
+    # Exponentially weighted mean and variance, starting from the first value
+    if stats["count"] == 1:
+        stats["mean"] = value
+    difference = value - stats["mean"]
+    increment = alpha * difference
+    stats["mean"] += increment
+    stats["var"] = (1 - alpha) * (stats["var"] + difference * increment)
+    
+    if stats["count"] <= settings["warmup"]:
+        # Exact median and MAD from the first few values, which are only kept until warmup ends
+        stats["warmup_values"].append(value)
+        values = np.array(stats["warmup_values"])
+        stats["median"] = float(np.median(values))
+        stats["mad"] = float(np.median(np.abs(values - stats["median"])))
+        if stats["count"] == settings["warmup"]:
+            stats["warmup_values"] = []
+    else:
+        # Frugal streaming estimates: nudge the median and MAD towards each value by a step scaled to the spread
+        step = alpha * max(stats["mad"], 1e-3)
+        deviation = abs(value - stats["median"])
+        stats["median"] += step if value > stats["median"] else -step if value < stats["median"] else 0.0
+        stats["mad"] = max(stats["mad"] + (step if deviation > stats["mad"] else -step), 0.0)
+        
+    return z, robust_z
+
+def _update_balance(balance_state, day, balance, settings):
+    """ 
+    Tracks the EWMA of the daily balance change and projects how many days remain until it reaches zero
+    """
+    last_day = balance_state["day"]
+    if last_day is not None and day > last_day:
+        # Change per day since the last balance of the previous posting day
+        change = (balance - balance_state["balance"]) / (day - last_day)
+        if balance_state["daily_change"] is None:
+            balance_state["daily_change"] = change
+        else:
+            balance_state["daily_change"] += settings["alpha"] * (change - balance_state["daily_change"])
+            
+    # Rows older than the newest one seen so far don't move the trajectory
+    if last_day is None or day >= last_day:
+        balance_state["day"] = day
+        balance_state["balance"] = balance
+        
+    daily_change = balance_state["daily_change"]
+    if balance <= 0:
+        return 0.0
+    if daily_change is not None and daily_change < 0:
+        return balance / -daily_change
+    return math.inf
+
+def _score_transaction(state, category, amount, day, balance):
+    """ 
+    Scores one transaction and updates the detector state, returning its z-scores and days until zero balance
+    """
+    settings = state["settings"]
+    z = robust_z = days_to_zero = math.nan
+    
+    # Only debits are scored, against the log amounts of earlier debits in the same category
+    if amount < 0:
+        stats = state["categories"].get(category)
+        if stats is None:
+            stats = state["categories"][category] = {
+                "count": 0, "mean": 0.0, "var": 0.0, "median": 0.0, "mad": 0.0, "warmup_values": []
+            }
+        z, robust_z = _update_category(stats, math.log1p(-amount), settings)
+        
+    if not math.isnan(balance):
+        days_to_zero = _update_balance(state["balance"], day, balance, settings)
+        
+    return z, robust_z, days_to_zero
+
+def _anomaly_alerts(settings, z, robust_z, days_to_zero):
+    """ 
+    Turns scores into amount and balance alert flags, works on scalars and arrays
+    """
+    amount_alert = (np.abs(z) > settings["z_threshold"]) | (np.abs(robust_z) > settings["robust_threshold"])
+    return amount_alert, days_to_zero <= settings["alert_days"]
+
+def detect_anomaly(state, transaction):
+    """ 
+    Scores a single transaction, a dict with Date, Description, Amount and Current balance, fed oldest first
+    """
+    category = categorize_transaction(transaction["Description"])
+    z, robust_z, days_to_zero = _score_transaction(
+        state, category, money_column(transaction, "Amount"), pd.Timestamp(transaction["Date"]).value // DAY_NANOSECONDS,
+        money_column(transaction, "Current balance")
+    )
+    amount_alert, balance_alert = _anomaly_alerts(state["settings"], z, robust_z, days_to_zero)
+    
+    return {
+        "Category": category,
+        "z_score": float(z),
+        "robust_z_score": float(robust_z),
+        "days_to_zero": float(days_to_zero),
+        "amount_alert": bool(amount_alert),
+        "balance_alert": bool(balance_alert)
+    }
+
+@instrumented
+def detect_anomalies(state, bank_df):
+    """ 
+    Scores a micro-batch of transactions in date order, updating the detector state as it goes
+    
+    Categorizing and type conversion are vectorized; the scoring itself is sequential since each
+    transaction updates the state the next one is scored against. Scores come back in the batch's
+    own row order.
+    """
+    categories = categorize_transactions(bank_df["Description"]).astype(object)
+    amounts = money_column(bank_df, "Amount").to_numpy(dtype=float)
+    days = pd.to_datetime(bank_df["Date"]).to_numpy(dtype="datetime64[ns]").astype(np.int64) // DAY_NANOSECONDS
+    balances = money_column(bank_df, "Current balance").to_numpy(dtype=float)
+    
+    # Bank exports list the newest posting first, so those are reversed, which also puts each day's
+    # postings in order; any other batch is stably sorted by date
+    if len(days) > 1 and days[0] > days[-1] and np.all(np.diff(days) <= 0):
+        order = np.arange(len(days))[::-1]
+    else:
+        order = np.argsort(days, kind="stable")
+        
+    # Plain Python scalars are much faster than NumPy ones in the per-row loop
+    rows = zip(categories.to_numpy()[order], amounts[order].tolist(), days[order].tolist(), balances[order].tolist())
+    scores = np.empty((len(days), 3), dtype=float)
+    scores[order] = np.array([_score_transaction(state, *row) for row in rows], dtype=float).reshape(-1, 3)
+    amount_alert, balance_alert = _anomaly_alerts(state["settings"], *scores.T)
+    
+    return pd.DataFrame({
+        "Category": categories,
+        "z_score": scores[:, 0],
+        "robust_z_score": scores[:, 1],
+        "days_to_zero": scores[:, 2],
+        "amount_alert": amount_alert,
+        "balance_alert": balance_alert
+    }, index=bank_df.index)
+
+@instrumented
+def plot_monthly_spending(bank_df, cube=None, output_path=None, show=True, series=None):
+    """ 
+    Plots total spending for each calendar month in the data, from the daily series unless only a cube is given
+    """
+    import matplotlib.pyplot as plt
+    
+    if cube is not None and series is None:
+        # A cube only knows month names, so months are ordered by when they first appear, as before
+        monthly_spending = _cube_rollup(cube, "Month").sort_values("first_date")["sum"].rename("Absolute_Amount")
+    else:
+        if series is None:
+            series = build_spending_series(bank_df)
+        monthly = spending_series_totals(series, "MS")
+        
+        # Label with the year too, so the same month in different years stays separate
+        monthly_spending = monthly["spend"].rename("Absolute_Amount")
+        monthly_spending.index = monthly_spending.index.strftime("%B %Y").rename("Month")
+    
+    fig = plt.figure(figsize=(12, 6))
+    monthly_spending.plot(kind="bar", color="lightblue", edgecolor="black")
+    plt.title("Total Monthly Spending", fontsize=16)
+    plt.xlabel("Month", fontsize=12)
+    plt.ylabel("Total Spending ($)", fontsize=12)
+    plt.xticks(rotation=45)
+    plt.grid(axis="y", alpha=0.3)
     plt.tight_layout()
-    plt.show()
+    _finish_figure(fig, output_path, show, keep=False)
     
     return monthly_spending
 
-def get_period_spending_statistics(merged_df):
+@instrumented
+def get_period_spending_statistics(merged_df, cube=None):
     """ 
-    Analyzes spending patterns across different academic periods
+    Analyzes spending patterns across different academic periods, all of them read from the cube without rescanning raw rows
     """
-    debit_data = merged_df[merged_df["Transaction_Type"] == "Debit"]
-    
+    if cube is None:
+        cube = build_spending_cube(merged_df)
+        
     # Period statistics
-    period_stats = debit_data.groupby("period_type")["Absolute_Amount"].agg(["mean", "median", "count", "sum"])
+    period_rollup = _cube_rollup(cube, "period_type")
+    medians = _cube_quantile(cube, 0.5, by="period_type")
+    period_stats = _sorted_labels(pd.DataFrame({
+        "mean": period_rollup["mean"],
+        "median": medians.reindex(period_rollup.index),
+        "count": period_rollup["count"],
+        "sum": period_rollup["sum"]
+    }))
     
     # Category breakdown by period
-    period_category = debit_data.groupby(["period_type", "Category"])["Absolute_Amount"].sum().unstack(fill_value=0)
+    period_category = _cube_rollup(cube, ["period_type", "Category"])["sum"].unstack(fill_value=0)
+    period_category = _sorted_labels(_sorted_labels(period_category), axis=1)
     
     return period_stats, period_category
 
-def test_weekend_vs_weekday_spending(merged_df):
+def discover_batch_jobs(source):
+    """ 
+    Lists (job id, bank file, calendar file) jobs from a manifest csv or from a directory of per-customer folders
+    """
+    # A manifest has bank_path and academic_path columns (and optionally job_id), relative to the manifest
+    if os.path.isfile(source):
+        manifest = pd.read_csv(source)
+        base_dir = os.path.dirname(os.path.abspath(source))
+        if "job_id" not in manifest.columns:
+            manifest["job_id"] = [f"job_{i}" for i in range(len(manifest))]
+        return [
+            (str(row.job_id), os.path.join(base_dir, row.bank_path), os.path.join(base_dir, row.academic_path))
+            for row in manifest.itertuples(index=False)
+        ]
+    
+    # Otherwise every folder holding a bank_data.csv and an academic_calendar.csv is one job
+    jobs = []
+    for name in sorted(os.listdir(source)):
+        bank_path = os.path.join(source, name, "bank_data.csv")
+        academic_path = os.path.join(source, name, "academic_calendar.csv")
+        if os.path.isfile(bank_path) and os.path.isfile(academic_path):
+            jobs.append((name, bank_path, academic_path))
+    return jobs
+
+def _run_batch_job(job_id, bank_path, academic_path, merged_output_dir=None):
+    """ 
+    Runs load, clean, merge and statistics for one bank export, reporting failures instead of raising them
+    """
+    start = time.perf_counter()
+    try:
+        bank_df, academic_df = load_data(bank_path, academic_path)
+        bank_df = clean_bank_data(bank_df)
+        academic_df = clean_academic_data(academic_df)
+        
+        # Merged rows are only written out when an output folder is given
+        output_filename = os.path.join(merged_output_dir, f"{job_id}_merged.csv") if merged_output_dir else None
+        merged_df = merge_datasets(bank_df, academic_df, output_filename=output_filename,
+                                   save=merged_output_dir is not None)
+        spending_stats = get_spending_statistics(merged_df)
+        top_categories = spending_stats["top_categories"]
+        
+        return {
+            "job_id": job_id,
+            "status": "ok",
+            "error": None,
+            "rows": len(bank_df),
+            "average": spending_stats["average"],
+            "median": spending_stats["median"],
+            "max": spending_stats["max"],
+            "min": spending_stats["min"],
+            "total": spending_stats["total"],
+            "count": spending_stats["count"],
+            "top_category": top_categories.index[0] if len(top_categories) else None,
+            "seconds": time.perf_counter() - start
+        }
+    except Exception as error:
+        return {
+            "job_id": job_id,
+            "status": "failed",
+            "error": f"{type(error).__name__}: {error}",
+            "rows": 0,
+            "seconds": time.perf_counter() - start
+        }
+
+def _failed_batch_result(job, error):
+    """ 
+    Result row for a job that failed outside _run_batch_job, such as one lost with a crashed worker
+    """
+    return {"job_id": job[0], "status": "failed", "rows": 0, "error": f"{type(error).__name__}: {error}"}
+
+def _restart_batch_pool(executor, pending, results, lost, max_workers):
+    """ 
+    Collects the jobs left on a broken pool, finished or lost, and returns a fresh pool for the remaining jobs
+    """
+    # A dead worker breaks the whole pool, so every job still on it either finished first or was lost with it
+    wait(pending)
+    for future, job in pending.items():
+        try:
+            results.append(future.result())
+        except BrokenProcessPool:
+            lost.append(job)
+        except Exception as error:
+            results.append(_failed_batch_result(job, error))
+    pending.clear()
+    
+    executor.shutdown(wait=False)
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+def _rerun_lost_batch_job(job, merged_output_dir):
+    """ 
+    Reruns a job lost with a broken pool in a pool of its own, so only a job that crashes itself fails
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(_run_batch_job, *job, merged_output_dir).result()
+        except Exception as error:
+            return _failed_batch_result(job, error)
+
+@instrumented
+def run_batch(source, output_path="batch_statistics.csv", max_workers=None, max_pending=None, merged_output_dir=None):
+    """ 
+    Processes many bank exports across a process pool and writes one consolidated statistics table
+    """
+    jobs = discover_batch_jobs(source) if isinstance(source, (str, os.PathLike)) else list(source)
+    if merged_output_dir is not None:
+        os.makedirs(merged_output_dir, exist_ok=True)
+        
+    # Only a bounded number of jobs are queued at once, so thousands of exports don't pile up in memory
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    
+    start = time.perf_counter()
+    results = []
+    remaining = iter(jobs)
+    pending = {}
+    lost = []
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            for job in itertools.islice(remaining, max_pending - len(pending)):
+                try:
+                    pending[executor.submit(_run_batch_job, *job, merged_output_dir)] = job
+                except BrokenProcessPool:
+                    # The pool broke before this job reached it, so it runs on the replacement
+                    executor = _restart_batch_pool(executor, pending, results, lost, max_workers)
+                    pending[executor.submit(_run_batch_job, *job, merged_output_dir)] = job
+            if not pending:
+                break
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                job = pending.pop(future)
+                
+                # Jobs lost with a crashed worker are rerun at the end, other errors are failed jobs
+                try:
+                    results.append(future.result())
+                except BrokenProcessPool:
+                    lost.append(job)
+                    broken = True
+                except Exception as error:
+                    results.append(_failed_batch_result(job, error))
+                    
+            if broken:
+                executor = _restart_batch_pool(executor, pending, results, lost, max_workers)
+    finally:
+        executor.shutdown()
+        
+    # Which of the lost jobs killed its worker is unknown, so each one gets a second run on its own
+    results.extend(_rerun_lost_batch_job(job, merged_output_dir) for job in lost)
+    
+    seconds = time.perf_counter() - start
+    statistics = pd.DataFrame(results)
+    if not statistics.empty:
+        statistics = statistics.sort_values("job_id").reset_index(drop=True)
+    if output_path is not None:
+        statistics.to_csv(output_path, index=False)
+        
+    total_rows = int(statistics["rows"].sum()) if not statistics.empty else 0
+    return {
+        "statistics": statistics,
+        "jobs": len(jobs),
+        "failed": int((statistics["status"] == "failed").sum()) if not statistics.empty else 0,
+        "seconds": seconds,
+        "files_per_second": len(jobs) / seconds if seconds > 0 else 0.0,
+        "rows_per_second": total_rows / seconds if seconds > 0 else 0.0
+    }
+    
+@instrumented
+def summarize_spending_groups(merged_df, by="period_type"):
+    """ 
+    Returns count, mean and M2 (sum of squared deviations) of debit spending for each group, including rows with no group
+    """
+    # Only the two columns needed are filtered, not the whole frame
+    is_debit = (merged_df["Transaction_Type"] == "Debit").to_numpy()
+    amounts = merged_df["Absolute_Amount"][is_debit].astype(float)
+    groups = amounts.groupby(merged_df[by][is_debit], dropna=False, observed=True)
+    
+    summary = pd.DataFrame({
+        "n": groups.count(),
+        "mean": groups.mean(),
+        "m2": groups.var(ddof=0) * groups.count()
+    })
+    summary.index = summary.index.astype(object)
+    return summary
+
+def combine_spending_summaries(left, right):
+    """ 
+    Merges two group summaries as if their rows had been summarized together (Chan et al. parallel Welford update)
+    """
+    index = left.index.union(right.index, sort=False)
+    left = left.reindex(index, fill_value=0)
+    right = right.reindex(index, fill_value=0)
+    
+    n = left["n"] + right["n"]
+    delta = right["mean"] - left["mean"]
+    weight = (right["n"] / n.where(n > 0)).fillna(0)
+    
+    return pd.DataFrame({
+        "n": n,
+        "mean": left["mean"] + delta * weight,
+        "m2": left["m2"] + right["m2"] + delta ** 2 * left["n"] * weight
+    })
+
+def update_spending_summary(summary, new_merged_df, by="period_type"):
+    """ 
+    Folds newly arrived transactions into an existing group summary without rescanning old rows
+    """
+    return combine_spending_summaries(summary, summarize_spending_groups(new_merged_df, by=by))
+
+def _pool_summary(summary, mask):
+    """ 
+    Collapses the selected groups of a summary into one (n, mean, m2) triple
+    """
+    selected = summary[mask]
+    n = int(selected["n"].sum())
+    if n == 0:
+        return 0, np.nan, np.nan
+    
+    mean = (selected["n"] * selected["mean"]).sum() / n
+    m2 = selected["m2"].sum() + (selected["n"] * (selected["mean"] - mean) ** 2).sum()
+    return n, mean, m2
+
+def _summary_std(n, m2):
+    """ 
+    Sample standard deviation from a count and M2, like Series.std()
+    """
+    return np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+
+def welch_ttest_from_summaries(first, second):
+    """ 
+    Welch's two-sample t-test from (n, mean, m2) summaries, matching scipy.stats.ttest_ind(equal_var=False)
+    """
+    from scipy import stats
+    
+    n1, mean1, m2_1 = first
+    n2, mean2, m2_2 = second
+    var1 = m2_1 / (n1 - 1) if n1 > 1 else np.nan
+    var2 = m2_2 / (n2 - 1) if n2 > 1 else np.nan
+    
+    standard_error_sq = var1 / n1 + var2 / n2
+    t_stat = (mean1 - mean2) / np.sqrt(standard_error_sq)
+    welch_df = standard_error_sq ** 2 / ((var1 / n1) ** 2 / (n1 - 1) + (var2 / n2) ** 2 / (n2 - 1))
+    p_value = 2 * stats.t.sf(np.abs(t_stat), welch_df)
+    
+    return t_stat, p_value
+
+@instrumented
+def test_weekend_vs_weekday_spending(merged_df, summary=None):
     """ 
     Performs t-test comparing weekend vs weekday spending and returns statistics for two-tailed test
     """
-    debit_data = merged_df[merged_df["Transaction_Type"] == "Debit"]
+    from scipy import stats
     
-    # Extract spending data
-    weekend_spending = debit_data[debit_data["period_type"] == "Weekend"]["Absolute_Amount"]
-    weekday_spending = debit_data[~debit_data["period_type"].isin(["Weekend", "Break"])]["Absolute_Amount"]
+    if summary is None:
+        summary = summarize_spending_groups(merged_df)
+    periods = summary.index
+    
+    # Pool the period summaries into each side of the test
+    weekend = _pool_summary(summary, periods == "Weekend")
+    weekday = _pool_summary(summary, ~periods.isin(["Weekend", "Break"]))
     
     # Basic statistics
-    weekend_mean = weekend_spending.mean()
-    weekday_mean = weekday_spending.mean()
-    weekend_std = weekend_spending.std()
-    weekday_std = weekday_spending.std()
-    weekend_n = len(weekend_spending)
-    weekday_n = len(weekday_spending)
+    weekend_n, weekend_mean, weekend_m2 = weekend
+    weekday_n, weekday_mean, weekday_m2 = weekday
+    weekend_std = _summary_std(weekend_n, weekend_m2)
+    weekday_std = _summary_std(weekday_n, weekday_m2)
     
     # Perform t-test, two-tailed
-    t_stat, p_value = stats.ttest_ind(weekday_spending, weekend_spending, equal_var=False)
+    t_stat, p_value = welch_ttest_from_summaries(weekday, weekend)
     
     # Critical value, two-tailed, alpha = 0.05
     df = min(weekend_n - 1, weekday_n - 1)
@@ -422,26 +1907,29 @@ def test_weekend_vs_weekday_spending(merged_df):
         "df": df
     }
     
-def test_assessment_vs_class_spending(merged_df):
+@instrumented
+def test_assessment_vs_class_spending(merged_df, summary=None):
     """ 
     Performs t-test comparing spending during assessment periods vs class periods and returns stats for a one-tailed test
     """
-    debit_data = merged_df[merged_df["Transaction_Type"] == "Debit"]
+    from scipy import stats
     
-    # Extract spending data
-    assessment_spending = debit_data[debit_data["period_type"] == "Assessment Period"]["Absolute_Amount"]
-    class_spending = debit_data[debit_data["period_type"] == "Class Period"]["Absolute_Amount"]
+    if summary is None:
+        summary = summarize_spending_groups(merged_df)
+    periods = summary.index
+    
+    # Pool the period summaries into each side of the test
+    assessment = _pool_summary(summary, periods == "Assessment Period")
+    class_period = _pool_summary(summary, periods == "Class Period")
     
     # Basic stats
-    assessment_mean = assessment_spending.mean()
-    class_mean = class_spending.mean()
-    assessment_std = assessment_spending.std()
-    class_std = class_spending.std()
-    assessment_n = len(assessment_spending)
-    class_n = len(class_spending)
+    assessment_n, assessment_mean, assessment_m2 = assessment
+    class_n, class_mean, class_m2 = class_period
+    assessment_std = _summary_std(assessment_n, assessment_m2)
+    class_std = _summary_std(class_n, class_m2)
     
     # Perform t-test
-    t_stat, p_value = stats.ttest_ind(assessment_spending, class_spending, equal_var=False)
+    t_stat, p_value = welch_ttest_from_summaries(assessment, class_period)
     
     # Adjust p-value for one-tailed test, testing if assessment < class
     p_value_one_tailed = p_value / 2 if t_stat < 0 else 1 - (p_value / 2)
@@ -463,26 +1951,29 @@ def test_assessment_vs_class_spending(merged_df):
         "df": df
     }
     
-def test_break_vs_regular_spending(merged_df):
+@instrumented
+def test_break_vs_regular_spending(merged_df, summary=None):
     """ 
     Performs t-test comparing spending during breaks vs regular periods and returns stats for two-tailed test
     """
-    debit_data = merged_df[merged_df["Transaction_Type"] == "Debit"]
+    from scipy import stats
+    
+    if summary is None:
+        summary = summarize_spending_groups(merged_df)
+    periods = summary.index
     
-    # Extract spending data
-    break_spending = debit_data[debit_data["period_type"] == "Break"]["Absolute_Amount"]
-    regular_spending = debit_data[debit_data["period_type"].isin(["Class Period", "Assessment Period"])]["Absolute_Amount"]
+    # Pool the period summaries into each side of the test
+    break_period = _pool_summary(summary, periods == "Break")
+    regular = _pool_summary(summary, periods.isin(["Class Period", "Assessment Period"]))
     
     # Basic stats
-    break_mean = break_spending.mean()
-    regular_mean = regular_spending.mean()
-    break_std = break_spending.std()
-    regular_std = regular_spending.std()
-    break_n = len(break_spending)
-    regular_n = len(regular_spending)
+    break_n, break_mean, break_m2 = break_period
+    regular_n, regular_mean, regular_m2 = regular
+    break_std = _summary_std(break_n, break_m2)
+    regular_std = _summary_std(regular_n, regular_m2)
     
     # Perform t-test
-    t_stat, p_value = stats.ttest_ind(break_spending, regular_spending, equal_var=False)
+    t_stat, p_value = welch_ttest_from_summaries(break_period, regular)
     
     # Critical value, two-tailed, alpha = 0.05
     df = min(break_n - 1, regular_n - 1)
@@ -501,10 +1992,132 @@ def test_break_vs_regular_spending(merged_df):
         "df": df
     }
     
-def prepare_classification_data(merged_df):
+# Upper bound on resampled values drawn per chunk, keeps each worker's index matrix to about 80 MB
+RESAMPLE_CHUNK_ELEMENTS = 10_000_000
+
+def _period_comparison_samples(merged_df):
     """ 
-    Prepares data for classification tasks using LabelEncoder
+    Splits debit spending into the same two sides the t-tests compare, as NumPy arrays
+    """
+    debit_data = merged_df[merged_df["Transaction_Type"] == "Debit"]
+    periods = debit_data["period_type"]
+    amounts = debit_data["Absolute_Amount"].to_numpy(dtype=float)
+    
+    return {
+        "weekend_vs_weekday": (amounts[(~periods.isin(["Weekend", "Break"])).to_numpy()],
+                               amounts[(periods == "Weekend").to_numpy()]),
+        "assessment_vs_class": (amounts[(periods == "Assessment Period").to_numpy()],
+                                amounts[(periods == "Class Period").to_numpy()]),
+        "break_vs_regular": (amounts[(periods == "Break").to_numpy()],
+                             amounts[periods.isin(["Class Period", "Assessment Period"]).to_numpy()])
+    }
+
+def _resample_chunk(first, second, method, n_resamples, seed):
+    """ 
+    Draws one chunk of resamples as index matrices and returns the difference in means for each
+    """
+    # A side with no rows has no mean, so neither does any resample
+    if len(first) == 0 or len(second) == 0:
+        return np.full(n_resamples, np.nan)
+    
+    rng = np.random.default_rng(seed)
+    
+    if method == "bootstrap":
+        # Each row of the index matrix is one resample drawn with replacement
+        first_means = first[rng.integers(0, len(first), size=(n_resamples, len(first)))].mean(axis=1)
+        second_means = second[rng.integers(0, len(second), size=(n_resamples, len(second)))].mean(axis=1)
+        return first_means - second_means
+    
+    # Permutation: shuffle the pooled amounts and split them back into groups of the original sizes
+    pooled = np.concatenate([first, second])
+    order = rng.permuted(np.broadcast_to(np.arange(len(pooled)), (n_resamples, len(pooled))), axis=1)
+    shuffled = pooled[order]
+    return shuffled[:, :len(first)].mean(axis=1) - shuffled[:, len(first):].mean(axis=1)
+
+@instrumented
+def resample_mean_difference(first, second, n_resamples=10_000, method="bootstrap", alternative="two-sided",
+                             confidence=0.95, seed=0, max_workers=None):
+    """ 
+    Bootstrap or permutation test for the difference in mean spending, spread across a process pool in chunks
     """
+    if method not in ("bootstrap", "permutation"):
+        raise ValueError(f"Unknown method {method!r}, expected 'bootstrap' or 'permutation'")
+    if alternative not in ("two-sided", "less", "greater"):
+        raise ValueError(f"Unknown alternative {alternative!r}, expected 'two-sided', 'less' or 'greater'")
+    
+    first = np.asarray(first, dtype=float)
+    second = np.asarray(second, dtype=float)
+    start = time.perf_counter()
+    
+    # Chunk sizes depend only on the data, and every chunk gets its own child seed, so results
+    # are the same no matter how many workers run them
+    chunk_size = max(1, RESAMPLE_CHUNK_ELEMENTS // (len(first) + len(second)))
+    chunk_sizes = [min(chunk_size, n_resamples - offset) for offset in range(0, n_resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    
+    chunk_args = ([first] * len(chunk_sizes), [second] * len(chunk_sizes), [method] * len(chunk_sizes), chunk_sizes, seeds)
+    if max_workers == 1 or len(chunk_sizes) == 1:
+        differences = list(map(_resample_chunk, *chunk_args))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            differences = list(executor.map(_resample_chunk, *chunk_args))
+    differences = np.concatenate(differences)
+    
+    observed = first.mean() - second.mean() if len(first) and len(second) else np.nan
+    
+    # Bootstrap differences are centred on the observed one, so shift them to the null of no difference
+    null_differences = differences - observed if method == "bootstrap" else differences
+    if alternative == "two-sided":
+        extreme = np.abs(null_differences) >= np.abs(observed)
+    elif alternative == "less":
+        extreme = null_differences <= observed
+    else:
+        extreme = null_differences >= observed
+    p_value = (extreme.sum() + 1) / (n_resamples + 1) if not np.isnan(observed) else np.nan
+    
+    # Percentile confidence interval for the difference, only meaningful for the bootstrap
+    if method == "bootstrap":
+        ci_low, ci_high = np.quantile(differences, [(1 - confidence) / 2, (1 + confidence) / 2])
+    else:
+        ci_low, ci_high = np.nan, np.nan
+        
+    return {
+        "observed_difference": observed,
+        "p_value": p_value,
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "method": method,
+        "alternative": alternative,
+        "n_resamples": n_resamples,
+        "seconds": time.perf_counter() - start
+    }
+
+@instrumented
+def resample_period_comparisons(merged_df, n_resamples=10_000, method="bootstrap", seed=0, max_workers=None):
+    """ 
+    Runs the resampling test for the weekend/weekday, assessment/class and break/regular comparisons
+    """
+    # Same sidedness as the t-tests, the assessment test checks whether assessment spending is lower
+    alternatives = {"weekend_vs_weekday": "two-sided", "assessment_vs_class": "less", "break_vs_regular": "two-sided"}
+    
+    results = {}
+    for name, (first, second) in _period_comparison_samples(merged_df).items():
+        results[name] = resample_mean_difference(
+            first, second, n_resamples=n_resamples, method=method, alternative=alternatives[name],
+            seed=seed, max_workers=max_workers
+        )
+    return results
+    
+# Encoded feature columns used by the classifiers, in order
+FEATURE_COLUMNS = ["Day_Encoded", "Period_Encoded", "Category_Encoded"]
+
+@instrumented
+def encode_classification_data(merged_df):
+    """ 
+    Encodes and scales the classification features of all debit rows, without splitting them
+    """
+    from sklearn.preprocessing import LabelEncoder, MinMaxScaler
+    
     debit_data = merged_df[merged_df["Transaction_Type"] == "Debit"].copy()
     
     # Create label encoders for categorical variables
@@ -518,19 +2131,13 @@ def prepare_classification_data(merged_df):
     debit_data["Category_Encoded"] = category_encoder.fit_transform(debit_data["Category"])
     
     # Features and target
-    X = debit_data[["Day_Encoded", "Period_Encoded", "Category_Encoded"]]
-    y = debit_data["Spending_Bin"]
+    X = debit_data[FEATURE_COLUMNS]
+    y = debit_data["Spending_Bin"].astype(object)
     
     # Scale features
     scaler = MinMaxScaler()
     X_scaled = scaler.fit_transform(X)
     
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.3, random_state=0)
-    
-    # Class distribution
-    class_distribution = y.value_counts(normalize=True) * 100
-    
     # Store encoders
     encoders = {
         "day": day_encoder,
@@ -538,72 +2145,567 @@ def prepare_classification_data(merged_df):
         "category": category_encoder,
         "day_classes": list(day_encoder.classes_),
         "period_classes": list(period_encoder.classes_),
-        "category_classes": list(category_encoder.classes_)
+        "category_classes": list(category_encoder.classes_),
+        "scaler": scaler,
+        
+        # Most common code of each feature, used for values never seen during fitting
+        "fallback_codes": {column: int(X[column].mode().iloc[0]) for column in FEATURE_COLUMNS}
     }
     
+    return X_scaled, y, encoders
+
+@instrumented
+def prepare_classification_data(merged_df):
+    """ 
+    Prepares data for classification tasks using LabelEncoder
+    """
+    from sklearn.model_selection import train_test_split
+    
+    X_scaled, y, encoders = encode_classification_data(merged_df)
+    
+    # Split data
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.3, random_state=0)
+    
+    # Class distribution
+    class_distribution = y.value_counts(normalize=True) * 100
+    
     return X_train, X_test, y_train, y_test, class_distribution, encoders
 
-def train_knn_classifier(X_train, y_train, k=5):
+def build_spending_model(encoders, model):
+    """ 
+    Bundles the fitted encoders, scaler and a trained classifier into one picklable pipeline
+    """
+    return {
+        "classes": {
+            "Day_Encoded": encoders["day_classes"],
+            "Period_Encoded": encoders["period_classes"],
+            "Category_Encoded": encoders["category_classes"]
+        },
+        "fallback_codes": encoders["fallback_codes"],
+        "scale": encoders["scaler"].scale_,
+        "offset": encoders["scaler"].min_,
+        "model": model
+    }
+
+def save_spending_model(pipeline, path):
+    """ 
+    Saves a fitted spending pipeline to a file
+    """
+    with open(path, "wb") as model_file:
+        pickle.dump(pipeline, model_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_spending_model(path):
+    """ 
+    Loads a spending pipeline saved by save_spending_model
+    """
+    with open(path, "rb") as model_file:
+        return pickle.load(model_file)
+
+def encode_spending_features(pipeline, merged_df):
+    """ 
+    Encodes and scales the day, period and category features of merged rows with a fitted pipeline
+    """
+    source_columns = {"Day_Encoded": "Day_of_Week", "Period_Encoded": "period_type", "Category_Encoded": "Category"}
+    codes = np.empty((len(merged_df), len(FEATURE_COLUMNS)), dtype=float)
+    
+    for i, column in enumerate(FEATURE_COLUMNS):
+        # Same codes LabelEncoder gives, but values it never saw (-1) map to the fallback instead of raising
+        column_codes = pd.Index(pipeline["classes"][column]).get_indexer(merged_df[source_columns[column]].astype(object))
+        codes[:, i] = np.where(column_codes >= 0, column_codes, pipeline["fallback_codes"][column])
+        
+    # Same arithmetic as MinMaxScaler.transform
+    return codes * pipeline["scale"] + pipeline["offset"]
+
+@instrumented
+def predict_spending_bin(pipeline, merged_df, chunk_size=100_000):
+    """ 
+    Predicts the spending bin of each merged row, encoding and scoring the rows in vectorized chunks
+    """
+    predictions = []
+    for offset in range(0, len(merged_df), chunk_size):
+        features = encode_spending_features(pipeline, merged_df.iloc[offset:offset + chunk_size])
+        predictions.append(pipeline["model"].predict(features))
+        
+    values = np.concatenate(predictions) if predictions else np.array([], dtype=object)
+    return pd.Series(values, index=merged_df.index, name="Predicted_Spending_Bin")
+
+class PrototypeKNNClassifier:
     """ 
-    Trains a kNN classifier
+    kNN classifier over duplicate-collapsed training points, answered from a lookup table or a KD-tree
     """
+    def __init__(self, n_neighbors=5, max_table_size=1_000_000):
+        self.n_neighbors = n_neighbors
+        self.max_table_size = max_table_size
+        
+    def fit(self, X, y):
+        """ 
+        Collapses the training points into prototypes with per-class counts and builds the lookup table
+        """
+        from sklearn.neighbors import KDTree
+        
+        X = np.asarray(X, dtype=np.float32)
+        self.classes_, y_codes = np.unique(np.asarray(y), return_inverse=True)
+        
+        # One prototype per distinct feature vector, weighted by how often each class occurs there
+        self.prototypes_, inverse = np.unique(X, axis=0, return_inverse=True)
+        self.counts_ = np.zeros((len(self.prototypes_), len(self.classes_)), dtype=np.uint32)
+        np.add.at(self.counts_, (inverse.ravel(), y_codes), 1)
+        self.tree_ = KDTree(self.prototypes_)
+        
+        # Lookup table over every combination of seen feature values
+        self.axes_ = [np.unique(self.prototypes_[:, i]) for i in range(X.shape[1])]
+        shape = tuple(len(axis) for axis in self.axes_)
+        self.table_ = None
+        if np.prod(shape) <= self.max_table_size:
+            grid = np.stack([values.ravel() for values in np.meshgrid(*self.axes_, indexing="ij")], axis=1)
+            code_dtype = np.uint8 if len(self.classes_) <= 256 else np.uint16
+            self.table_ = self._vote(grid).astype(code_dtype).reshape(shape)
+            
+        return self
+    
+    def _vote(self, X):
+        """ 
+        Class codes of the weighted majority among the k nearest training points
+        """
+        # Each prototype holds at least one point, so k prototypes always cover k points
+        n_prototypes = min(self.n_neighbors, len(self.prototypes_))
+        _, neighbors = self.tree_.query(X, k=n_prototypes, sort_results=True)
+        
+        counts = self.counts_[neighbors].astype(np.float64)
+        totals = counts.sum(axis=2)
+        
+        # Take whole prototypes in distance order and a proportional share of the one that reaches k
+        before = np.cumsum(totals, axis=1) - totals
+        taken = np.clip(self.n_neighbors - before, 0, totals)
+        votes = (counts * (taken / totals)[:, :, None]).sum(axis=1)
+        
+        return votes.argmax(axis=1)
+    
+    def predict(self, X):
+        """ 
+        Predicts a class for each row, from the lookup table when the row is on its grid
+        """
+        X = np.asarray(X, dtype=np.float32)
+        codes = np.empty(len(X), dtype=np.intp)
+        on_grid = np.zeros(len(X), dtype=bool)
+        
+        if self.table_ is not None and len(X):
+            # Position of each feature value on its axis; rows with any unseen value are off the grid
+            positions = []
+            on_grid[:] = True
+            for i, axis in enumerate(self.axes_):
+                position = np.minimum(np.searchsorted(axis, X[:, i]), len(axis) - 1)
+                on_grid &= axis[position] == X[:, i]
+                positions.append(position)
+            codes[on_grid] = self.table_[tuple(position[on_grid] for position in positions)]
+            
+        if not on_grid.all():
+            codes[~on_grid] = self._vote(X[~on_grid])
+            
+        return self.classes_[codes]
+    
+    def score(self, X, y):
+        """ 
+        Returns the accuracy of the predictions for X against y
+        """
+        return float(np.mean(self.predict(X) == np.asarray(y)))
+
+@instrumented
+def train_knn_classifier(X_train, y_train, k=5, backend="sklearn"):
+    """ 
+    Trains a kNN classifier, either sklearn's or the compact prototype backend
+    """
+    if backend == "prototype":
+        return PrototypeKNNClassifier(n_neighbors=k).fit(X_train, y_train)
+    if backend != "sklearn":
+        raise ValueError(f"Unsupported kNN backend: {backend}")
+    
+    from sklearn.neighbors import KNeighborsClassifier
+    
     # Create and train kNN model
     knn_model = KNeighborsClassifier(n_neighbors=k)
     knn_model.fit(X_train, y_train)
     
     return knn_model
 
+@instrumented
 def train_decision_tree_classifier(X_train, y_train, max_depth=None):
     """ 
     Trains a Decision Tree Classifier
     """
+    from sklearn.tree import DecisionTreeClassifier
+    
     # Create and train a Decision Tree model
     dt_model = DecisionTreeClassifier(random_state=0, max_depth=max_depth)
     dt_model.fit(X_train, y_train)
     
     return dt_model
 
-def evaluate_classifier(model, X_test, y_test, model_name):
+def fixed_spending_encoders():
+    """ 
+    Builds the encoders encode_classification_data returns, but over the full day, period and category lists
+    
+    Encoders fitted on one batch would give different codes to the next, so online learning uses these
+    with build_spending_model and encode_spending_features to encode every micro-batch the same way.
+    """
+    from sklearn.preprocessing import LabelEncoder, MinMaxScaler
+    
+    day_encoder = LabelEncoder().fit(DAY_ORDER)
+    period_encoder = LabelEncoder().fit(PERIOD_TYPES)
+    category_encoder = LabelEncoder().fit(CATEGORIES)
+    
+    # Scale each full code range to [0, 1]
+    max_codes = [len(day_encoder.classes_) - 1, len(period_encoder.classes_) - 1, len(category_encoder.classes_) - 1]
+    scaler = MinMaxScaler().fit(np.array([[0] * len(FEATURE_COLUMNS), max_codes]))
+    
+    return {
+        "day": day_encoder,
+        "period": period_encoder,
+        "category": category_encoder,
+        "day_classes": list(day_encoder.classes_),
+        "period_classes": list(period_encoder.classes_),
+        "category_classes": list(category_encoder.classes_),
+        "scaler": scaler,
+        
+        # Every day is always known; unknown periods and categories count as Other
+        "fallback_codes": {
+            "Day_Encoded": 0,
+            "Period_Encoded": int(period_encoder.transform(["Other"])[0]),
+            "Category_Encoded": int(category_encoder.transform(["Other"])[0])
+        }
+    }
+
+class OnlineSpendingClassifier:
+    """ 
+    Online classifier over categorical features that keeps class counts per distinct feature vector
+    """
+    def __init__(self, classes=None, decay=1.0):
+        self.classes = classes
+        self.decay = decay
+        
+    def partial_fit(self, X, y, classes=None):
+        """ 
+        Adds one micro-batch to the class counts, after shrinking the old counts by decay
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=object)
+        
+        if not hasattr(self, "classes_"):
+            classes = classes if classes is not None else self.classes
+            self.classes_ = np.unique(np.asarray(classes if classes is not None else y, dtype=object))
+            self.cell_index_ = {}
+            self.cell_keys_ = np.empty((0, X.shape[1]), dtype=np.float64)
+            self.counts_ = np.empty((0, len(self.classes_)), dtype=np.float64)
+            
+        y_codes = np.minimum(np.searchsorted(self.classes_, y), len(self.classes_) - 1)
+        if len(y) and not np.all(self.classes_[y_codes] == y):
+            raise ValueError(f"Labels {sorted(set(y) - set(self.classes_))} are not in classes {list(self.classes_)}")
+        
+        if self.decay != 1.0:
+            self.counts_ *= self.decay
+            
+        # Add a row of counts for each feature vector this batch sees for the first time
+        keys, inverse = np.unique(X, axis=0, return_inverse=True)
+        new_keys = [key for key in map(tuple, keys.tolist()) if key not in self.cell_index_]
+        for key in new_keys:
+            self.cell_index_[key] = len(self.cell_index_)
+        if new_keys:
+            self.cell_keys_ = np.vstack([self.cell_keys_, np.array(new_keys)])
+            self.counts_ = np.vstack([self.counts_, np.zeros((len(new_keys), len(self.classes_)))])
+            
+        cells = np.array([self.cell_index_[key] for key in map(tuple, keys.tolist())], dtype=np.intp)
+        np.add.at(self.counts_, (cells[inverse.ravel()], y_codes), 1)
+        
+        return self
+    
+    def fit(self, X, y):
+        """ 
+        Forgets everything learned so far and trains on X and y as a single batch
+        """
+        for attribute in ["classes_", "cell_index_", "cell_keys_", "counts_"]:
+            self.__dict__.pop(attribute, None)
+        return self.partial_fit(X, y)
+    
+    def _naive_bayes_vote(self, key):
+        """ 
+        Class code with the highest Laplace-smoothed naive Bayes score for an unseen feature vector
+        """
+        class_totals = self.counts_.sum(axis=0)
+        scores = np.log(class_totals + 1)
+        for i, value in enumerate(key):
+            n_values = len(np.unique(self.cell_keys_[:, i]))
+            value_counts = self.counts_[self.cell_keys_[:, i] == value].sum(axis=0)
+            scores += np.log((value_counts + 1) / (class_totals + n_values + 1))
+        return scores.argmax()
+    
+    def predict(self, X):
+        """ 
+        Predicts the most common class of each row's feature vector, or the naive Bayes class if it was never seen
+        """
+        if not hasattr(self, "classes_"):
+            raise ValueError("OnlineSpendingClassifier must be fitted before predicting")
+        
+        X = np.asarray(X, dtype=np.float64)
+        keys, inverse = np.unique(X, axis=0, return_inverse=True)
+        codes = np.empty(len(keys), dtype=np.intp)
+        for j, key in enumerate(map(tuple, keys.tolist())):
+            cell = self.cell_index_.get(key)
+            codes[j] = self.counts_[cell].argmax() if cell is not None else self._naive_bayes_vote(key)
+            
+        return self.classes_[codes[inverse.ravel()]]
+    
+    def score(self, X, y):
+        """ 
+        Returns the accuracy of the predictions for X against y
+        """
+        return float(np.mean(self.predict(X) == np.asarray(y)))
+
+def spending_feature_batches(pipeline, merged_df, batch_size=5_000):
+    """ 
+    Yields (X, y) micro-batches of the encoded debit rows of merged_df, in row order
+    """
+    debit_data = merged_df[merged_df["Transaction_Type"] == "Debit"]
+    for offset in range(0, len(debit_data), batch_size):
+        batch = debit_data.iloc[offset:offset + batch_size]
+        yield encode_spending_features(pipeline, batch), batch["Spending_Bin"].to_numpy(dtype=object)
+        
+def prequential_evaluation(model, batches, labels=SPENDING_BINS):
+    """ 
+    Trains a model with partial_fit test-then-train: each batch is scored before the model learns from it
+    
+    The first batch only trains, since there is nothing to predict with yet. Returns the confusion matrix
+    and metrics over all scored rows and the accuracy of each batch, so drift shows up as a dip in the curve.
+    """
+    cm = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    history = []
+    n_scored = 0
+    n_seen = 0
+    
+    with measure("prequential_evaluation") as frame:
+        for X_batch, y_batch in batches:
+            if n_seen:
+                batch_cm = confusion_matrix_counts(y_batch, model.predict(X_batch), labels)
+                cm += batch_cm
+                n_scored += len(y_batch)
+                history.append({"seen_rows": n_seen, "rows": len(y_batch),
+                                "accuracy": np.trace(batch_cm) / len(y_batch) if len(y_batch) else np.nan})
+            model.partial_fit(X_batch, y_batch, classes=labels)
+            n_seen += len(y_batch)
+        frame["rows"] = n_seen
+        
+    return cm, classification_metrics(cm, labels, n_rows=n_scored), pd.DataFrame(history)
+
+# Rows of shared sweep data in the current process, set in each pool worker by _attach_sweep_data
+_SWEEP_DATA = {}
+
+def sweep_configurations(k_values=(1, 3, 5, 7, 9, 15), max_depths=(None, 3, 5, 10), feature_subsets=None):
+    """ 
+    Lists the classifier configurations of a sweep, one per model setting and feature subset
+    """
+    if feature_subsets is None:
+        feature_subsets = [subset for size in range(1, len(FEATURE_COLUMNS) + 1)
+                           for subset in itertools.combinations(FEATURE_COLUMNS, size)]
+        
+    configurations = []
+    for features in feature_subsets:
+        configurations += [{"model": "knn", "k": k, "features": list(features)} for k in k_values]
+        configurations += [{"model": "decision_tree", "max_depth": depth, "features": list(features)} for depth in max_depths]
+    return configurations
+
+def _attach_sweep_data(name, shape):
+    """ 
+    Pool initializer that maps the shared feature, label and fold matrix without copying it
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    _SWEEP_DATA.update(shm=shm, data=np.ndarray(shape, dtype=np.float64, buffer=shm.buf))
+
+def _sweep_task(configuration, fold):
+    """ 
+    Trains one configuration on every fold but one and returns its accuracy on the held out fold
+    """
+    data = _SWEEP_DATA["data"]
+    columns = [FEATURE_COLUMNS.index(feature) for feature in configuration["features"]]
+    test_rows = data[:, -1] == fold
+    X, y = data[:, columns], data[:, -2].astype(np.intp)
+    
+    start = time.perf_counter()
+    if configuration["model"] == "knn":
+        model = train_knn_classifier(X[~test_rows], y[~test_rows], k=configuration["k"])
+    else:
+        model = train_decision_tree_classifier(X[~test_rows], y[~test_rows], max_depth=configuration["max_depth"])
+    accuracy = float(np.mean(model.predict(X[test_rows]) == y[test_rows]))
+    
+    return accuracy, time.perf_counter() - start
+
+@instrumented
+def sweep_classifiers(merged_df, configurations=None, n_splits=5, seed=0, max_workers=None,
+                      cache_path="sweep_results.json"):
+    """ 
+    Stratified k-fold cross-validation of every configuration across a process pool, cached per data and configuration
+    """
+    from sklearn.model_selection import StratifiedKFold
+    
+    if configurations is None:
+        configurations = sweep_configurations()
+        
+    X_scaled, y, _ = encode_classification_data(merged_df)
+    classes, y_codes = np.unique(y.to_numpy(), return_inverse=True)
+    
+    # Fold of every row, stored as the last column next to the features and the label code
+    folds = np.empty(len(y_codes))
+    splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    for fold, (_, test_index) in enumerate(splitter.split(X_scaled, y_codes)):
+        folds[test_index] = fold
+    data = np.column_stack([X_scaled, y_codes, folds])
+    
+    # The cache key covers the data and the fold assignment as well as the configuration
+    data_digest = hashlib.sha256(data.tobytes()).hexdigest()[:16]
+    keys = [f"{data_digest}:{json.dumps(configuration, sort_keys=True)}" for configuration in configurations]
+    
+    cache = {}
+    if cache_path is not None and os.path.exists(cache_path):
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+            
+    pending = [(configuration, fold) for key, configuration in zip(keys, configurations) if key not in cache
+               for fold in range(n_splits)]
+    
+    if max_workers == 1 or len(pending) <= 1:
+        _SWEEP_DATA["data"] = data
+        try:
+            outcomes = [_sweep_task(*task) for task in pending]
+        finally:
+            _SWEEP_DATA.clear()
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+        try:
+            np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_sweep_data,
+                                     initargs=(shm.name, data.shape)) as executor:
+                outcomes = list(executor.map(_sweep_task, *zip(*pending)))
+        finally:
+            shm.close()
+            shm.unlink()
+            
+    # Tasks come back in submission order, n_splits per new configuration
+    for i, (configuration, _) in enumerate(pending[::n_splits]):
+        accuracies, seconds = zip(*outcomes[i * n_splits:(i + 1) * n_splits])
+        cache[f"{data_digest}:{json.dumps(configuration, sort_keys=True)}"] = {
+            "mean_accuracy": float(np.mean(accuracies)),
+            "std_accuracy": float(np.std(accuracies)),
+            "fold_accuracies": list(accuracies),
+            "seconds": float(np.sum(seconds))
+        }
+        
+    if cache_path is not None and pending:
+        with open(cache_path, "w") as cache_file:
+            json.dump(cache, cache_file, indent=2)
+            
+    results = pd.DataFrame([{"model": configuration["model"],
+                             "k": configuration.get("k"),
+                             "max_depth": configuration.get("max_depth"),
+                             "features": ", ".join(configuration["features"]),
+                             **cache[key]} for key, configuration in zip(keys, configurations)])
+    results.attrs["trained"] = len(pending) // n_splits
+    return results.sort_values("mean_accuracy", ascending=False, ignore_index=True)
+
+def confusion_matrix_counts(y_true, y_pred, labels):
+    """ 
+    Builds a confusion matrix (rows true, columns predicted) with one bincount over encoded label pairs
+    """
+    n_labels = len(labels)
+    label_index = pd.Index(labels)
+    true_codes = label_index.get_indexer(np.asarray(y_true, dtype=object)).astype(np.int64)
+    pred_codes = label_index.get_indexer(np.asarray(y_pred, dtype=object)).astype(np.int64)
+    
+    # Pairs with a label outside the list can't be placed in the matrix
+    known = (true_codes >= 0) & (pred_codes >= 0)
+    pairs = true_codes[known] * n_labels + pred_codes[known]
+    return np.bincount(pairs, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+
+def classification_metrics(cm, labels, n_rows=None):
+    """ 
+    Derives overall accuracy and per-class accuracy (recall), precision, recall, F1 and support from a confusion matrix
+    """
+    cm = np.asarray(cm, dtype=float)
+    true_positives = np.diag(cm)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    
+    # Empty rows or columns score 0 instead of dividing by zero
+    with np.errstate(divide="ignore", invalid="ignore"):
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        
+    # Rows whose prediction fell outside the labels are wrong but missing from the matrix, so count them via n_rows
+    total = n_rows if n_rows is not None else cm.sum()
+    per_class = pd.DataFrame({
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "support": support.astype(np.int64)
+    }, index=pd.Index(labels, name="label"))
+    
+    return {
+        "accuracy": true_positives.sum() / total if total > 0 else 0.0,
+        "per_class": per_class
+    }
+
+@instrumented
+def evaluate_classifier_in_batches(model, batches, labels):
+    """ 
+    Accumulates a confusion matrix over (X, y) batches so predictions can be scored on data that doesn't fit in memory
+    """
+    cm = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    n_rows = 0
+    for X_batch, y_batch in batches:
+        cm += confusion_matrix_counts(y_batch, model.predict(X_batch), labels)
+        n_rows += len(y_batch)
+        
+    return cm, classification_metrics(cm, labels, n_rows=n_rows)
+
+@instrumented
+def evaluate_classifier(model, X_test, y_test, model_name, output_path=None, show=True):
     """ 
     Evaluates a classifier with accuracy metric
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     # Make predictions
     y_pred = model.predict(X_test)
     
-    # Calculate accuracy
-    accuracy = accuracy_score(y_test, y_pred)
-    
     # Make confusion matrix visual
     labels = sorted(list(set(y_test)))
-    cm = np.zeros((len(labels), len(labels)))
+    cm = confusion_matrix_counts(y_test, y_pred, labels)
+    metrics = classification_metrics(cm, labels, n_rows=len(y_test))
     
-    for i, true_label in enumerate(labels):
-        for j, pred_label in enumerate(labels):
-            cm[i, j] = np.sum((y_test == true_label) & (y_pred == pred_label))
+    # Calculate accuracy
+    accuracy = metrics["accuracy"]
             
     # Plot confusion matrix
-    plt.figure(figsize=(10, 8))
+    fig = plt.figure(figsize=(10, 8))
     sns.heatmap(cm, annot=True, fmt="g", cmap="Blues", xticklabels=labels, yticklabels=labels)
     plt.title(f"{model_name} Confusion Matrix")
     plt.xlabel("Predicted Label")
     plt.ylabel("True Label")
     plt.tight_layout()
-    plt.show()
+    _finish_figure(fig, output_path, show, keep=False)
     
     # Calculate per-class accuracy
-    class_accuracy = {}
-    for label in labels:
-        true_positives = np.sum((y_test == label) & (y_pred == label))
-        total = np.sum(y_test == label)
-        class_accuracy[label] = true_positives / total if total > 0 else 0
+    class_accuracy = metrics["per_class"]["recall"].to_dict()
         
     return accuracy, class_accuracy
 
-def visualize_decision_tree(dt_model, feature_names, class_names, max_depth=3):
+def visualize_decision_tree(dt_model, feature_names, class_names, max_depth=3, output_path=None, show=True):
     """ 
     Visualizes the decision tree
     """
-    plt.figure(figsize=(15, 10))
+    import matplotlib.pyplot as plt
+    from sklearn.tree import plot_tree
+    
+    fig = plt.figure(figsize=(15, 10))
     plot_tree(dt_model,
               feature_names=feature_names,
               class_names=class_names,
@@ -612,16 +2714,19 @@ def visualize_decision_tree(dt_model, feature_names, class_names, max_depth=3):
               max_depth=max_depth)
     plt.title(f"Decision Tree (Limited to Depth {max_depth})")
     plt.tight_layout()
-    plt.show()
+    return _finish_figure(fig, output_path, show)
     
-def compare_classifier_performance(knn_accuracy, dt_accuracy):
+def compare_classifier_performance(knn_accuracy, dt_accuracy, output_path=None, show=True):
     """
     Compares performance of different classifiers 
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     models = ["kNN", "Decision Tree"]
     accuracies = [knn_accuracy, dt_accuracy]
     
-    plt.figure(figsize=(8, 6))
+    fig = plt.figure(figsize=(8, 6))
     sns.barplot(x=models, y=accuracies)
     plt.title("Model Accuracy Comparison")
     plt.ylabel("Accuracy")
@@ -629,4 +2734,61 @@ def compare_classifier_performance(knn_accuracy, dt_accuracy):
     for i, acc in enumerate(accuracies):
         plt.text(i, acc + 0.01, f"{acc:.3f}", ha="center")
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    return _finish_figure(fig, output_path, show)
+
+def use_headless_plotting():
+    """ 
+    Switches matplotlib to the non-interactive Agg backend, for batch jobs that only save figures
+    """
+    import matplotlib
+    
+    matplotlib.use("Agg", force=True)
+
+def _render_report(function_name, args, kwargs, output_path):
+    """ 
+    Renders one report in a worker process by calling the named plot function
+    """
+    globals()[function_name](*args, output_path=output_path, show=False, **kwargs)
+    return output_path
+
+def build_report_jobs(bank_df, merged_df, cube=None):
+    """ 
+    Lists the standard spending report figures as (name, function name, args, kwargs) jobs for render_reports
+    """
+    # The cube and daily series are far smaller than the rows, so they are what gets sent to the workers where possible
+    if cube is None:
+        cube = build_spending_cube(merged_df)
+        
+    return [
+        ("spending_distribution", "plot_spending_distribution", (bank_df,), {}),
+        ("spending_by_category", "plot_spending_by_category", (None,), {"cube": cube}),
+        ("spending_by_day", "plot_spending_by_day", (None,), {"cube": cube}),
+        ("spending_by_period", "plot_spending_by_period", (None,), {"cube": cube}),
+        ("monthly_spending", "plot_monthly_spending", (None,), {"series": build_spending_series(bank_df)})
+    ]
+
+@instrumented
+def render_reports(reports, output_dir, max_workers=None, file_format="png"):
+    """ 
+    Renders many report figures to files in parallel across a process pool, each worker using the Agg backend
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    paths = {}
+    errors = {}
+    
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=use_headless_plotting) as executor:
+        futures = {
+            name: executor.submit(_render_report, function_name, args, kwargs,
+                                  os.path.join(output_dir, f"{name}.{file_format}"))
+            for name, function_name, args, kwargs in reports
+        }
+        
+        # One broken report shouldn't stop the rest from rendering
+        for name, future in futures.items():
+            try:
+                paths[name] = future.result()
+            except Exception as error:
+                errors[name] = repr(error)
+                
+    return {"paths": paths, "errors": errors, "seconds": time.perf_counter() - start}